@@ -7,7 +7,7 @@ try:
 except ImportError:
     pass
 
-from src.scraper import transformation
+from src.scraper import parser, transformation
 
 
 GCP_API_KEY = os.getenv('GCP_API_KEY')
@@ -23,6 +23,24 @@ OTODOM_SERVER_PORT = os.getenv('OTODOM_SERVER_PORT', '')
 OTODOM_SCHEMA_NAME = os.getenv('OTODOM_SCHEMA_NAME', '')
 OTODOM_USERNAME = os.getenv('OTODOM_USERNAME', '')
 OTODOM_PASSWORD = os.getenv('OTODOM_PASSWORD', '')
+DB_POOL = {
+    'min_size': 1,
+    'max_size': 4,
+    'timeout': 30.0,
+    'max_idle': 300.0
+}
+SQLITE = {
+    'cached_statements': 512,
+    'timeout': 30.0,
+    'pragmas': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'cache_size': -64 * 1024,
+        'busy_timeout': 30000
+    }
+}
 
 
 
@@ -40,8 +58,34 @@ START_URLS = {
         'entity_type': 'flats'
     }
 }
+INCREMENTAL_CRAWL = {
+    'enabled': True,
+    'full_crawl_every_hours': 24,
+    'newest_first_params': {'by': 'LATEST', 'direction': 'DESC'}
+}
+LISTING_REFRESH = {
+    'listing_only': True,
+    'compared_fields': ['price', 'area', 'rooms']
+}
+REVISIT = {
+    'enabled': True,
+    'budget_per_run': 300,
+    'min_hours': 6,
+    'max_hours': 24 * 14,
+    'doubling_days': 7,
+    'new_offer_days': 3,
+    'absent_from_listing_factor': 0.25
+}
 DOMAIN_NAME = 'https://www.otodom.pl:443'
 OFFER_LINK_STARTSWITH = '/pl/oferta/'
+PARSER = {
+    'backend': 'html.parser'  # html.parser, lxml or selectolax
+}
+PARSING = {
+    'workers': os.cpu_count() or 1,  # 1 parses in the main process
+    'min_items_per_worker': 25,
+    'chunksize': 8
+}
 SOURCE_FOLDER = 'source_folder'
 DETAIL_HTML_FILEPATH_TEMPLATE = SOURCE_FOLDER + '/{id4}/{timestamp}.html'
 # tag: attributes dict[key, value]
@@ -74,6 +118,35 @@ HIERARCHIES = {
             'currentPage'
         ]
     },
+    'listing_items': {
+        'stages': [
+            {
+                'path': [
+                    {'body': {}},
+                    {'script': {}}
+                ],
+                'transformation': json.loads,
+                'input': 'soup'
+            },
+            {
+                'path': [
+                    {'props': {}},
+                    {'pageProps': {}},
+                    {'data': {}},
+                    {'searchAds': {}},
+                    {'items': {}}
+                ],
+                'transformation': None,
+                'input': 'json'
+            }
+        ],
+        'attributes': [
+            'slug',
+            'totalPrice',
+            'areaInSquareMeters',
+            'roomsNumber'
+        ]
+    },
     'offer_links': {
         'stages': [
             {
@@ -367,6 +440,224 @@ HIERARCHY_DETAILS = {
     }
 }
 
+# Offer columns from the fields extracted by HIERARCHY_DETAILS.
+# A column takes the first truthy source, or the last source value when none is.
+# parser is applied to every source value, default replaces a missing path,
+# format is applied to the chosen value and guard sets the column to None
+# unless the value at its path is at least min_length long.
+OFFER_FIELDS = {
+    'city': {
+        'sources': [
+            ['city', 'name'],
+            ['location', 'address', 'city', 'name']
+        ]
+    },
+    'postal_code': {
+        'sources': [
+            ['location', 'address', 'postalCode'],
+            ['location', 'address', 'postalCode', 'name'],
+            ['city', 'id']
+        ],
+        'guard': {'path': ['city', 'id'], 'min_length': 5}
+    },
+    'street': {
+        'sources': [
+            ['street'],
+            ['location', 'address', 'street', 'name']
+        ],
+        'parser': parser.parse_street
+    },
+    'price': {
+        'sources': [
+            ['characteristics', 'Cena', 'value'],
+            ['characteristics', 'price', 'value'],
+            ['topInformation', 'price', 'values']
+        ]
+    },
+    'area': {
+        'sources': [
+            ['characteristics', 'Powierzchnia', 'value'],
+            ['characteristics', 'm', 'value'],
+            ['topInformation', 'area', 'values'],
+            ['target', 'Area']
+        ]
+    },
+    'price_per_m2': {
+        'sources': [
+            ['characteristics', 'cena za metr', 'value'],
+            ['characteristics', 'price_per_m', 'value'],
+            ['target', 'Price_per_m']
+        ]
+    },
+    'floors': {
+        'sources': [
+            ['characteristics', 'Liczba pięter', 'value'],
+            ['characteristics', 'floors_num', 'value'],
+            ['additionalInformation', 'floors_num', 'values'],
+            ['target', 'floors_num']
+        ],
+        'parser': parser.parse_floors
+    },
+    'floor': {
+        'sources': [
+            ['characteristics', 'Piętro', 'localizedValue'],
+            ['characteristics', 'floor', 'localizedValue'],
+            ['additionalInformation', 'floors', 'values'],
+            ['characteristics', 'floor', 'value']
+        ],
+        'parser': parser.parse_floor
+    },
+    'rooms': {
+        'sources': [
+            ['characteristics', 'Liczba pokoi', 'value'],
+            ['characteristics', 'rooms_num', 'value'],
+            ['topInformation', 'rooms_num', 'values'],
+            ['target', 'Rooms_num']
+        ],
+        'parser': parser.parse_rooms
+    },
+    'build_year': {
+        'sources': [
+            ['characteristics', 'Rok budowy', 'value'],
+            ['characteristics', 'build_year', 'value'],
+            ['topInformation', 'build_year', 'values'],
+            ['target', 'Build_year']
+        ]
+    },
+    'building_type': {
+        'sources': [
+            ['characteristics', 'Rodzaj zabudowy', 'value'],
+            ['characteristics', 'building_type', 'value'],
+            ['topInformation', 'building_type', 'values'],
+            ['target', 'Building_type']
+        ]
+    },
+    'building_material': {
+        'sources': [
+            ['characteristics', 'Materiał budynku', 'value'],
+            ['characteristics', 'building_material', 'value'],
+            ['additionalInformation', 'building_material', 'values']
+        ]
+    },
+    'rent': {
+        'sources': [
+            ['characteristics', 'Czynsz', 'value'],
+            ['characteristics', 'rent', 'value'],
+            ['topInformation', 'rent', 'values']
+        ]
+    },
+    'windows': {
+        'sources': [
+            ['characteristics', 'Okna', 'value'],
+            ['characteristics', 'windows_type', 'value'],
+            ['additionalInformation', 'windows_type', 'values']
+        ]
+    },
+    'land_area': {
+        'sources': [
+            ['characteristics', 'Powierzchnia działki', 'value'],
+            ['characteristics', 'terrain_area', 'value'],
+            ['topInformation', 'terrain_area', 'values'],
+            ['target', 'Terrain_area']
+        ]
+    },
+    'construction_status': {
+        'sources': [
+            ['characteristics', 'Stan wykończenia', 'value'],
+            ['characteristics', 'construction_status', 'value'],
+            ['topInformation', 'construction_status', 'values'],
+            ['target', 'Construction_status']
+        ]
+    },
+    'market': {
+        'sources': [
+            ['characteristics', 'Rynek', 'value'],
+            ['characteristics', 'market', 'value'],
+            ['additionalInformation', 'market', 'values'],
+            ['target', 'MarketType']
+        ]
+    },
+    'posted_by': {'sources': [['posted_by']]},
+    'description': {'sources': [['description']]},
+    'ground_plan': {'sources': [['characteristics', 'Rzut mieszkania', 'value']]},
+    'coordinates_lat_lon': {
+        'sources': [['coordinates']],
+        'default': {},
+        'format': transformation.join_values
+    },
+    'informacje_dodatkowe_json': {
+        'sources': [
+            ['other', 'Informacje dodatkowe'],
+            ['featuresByCategory', 'Informacje dodatkowe']
+        ],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'media_json': {
+        'sources': [
+            ['other', 'Media'],
+            ['featuresByCategory', 'Media']
+        ],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'ogrodzenie_json': {
+        'sources': [
+            ['other', 'Ogrodzenie'],
+            ['featuresByCategory', 'Ogrodzenie']
+        ],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'dojazd_json': {
+        'sources': [
+            ['other', 'Dojazd'],
+            ['featuresByCategory', 'Dojazd']
+        ],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'ogrzewanie_json': {
+        'sources': [
+            ['other', 'Ogrzewanie'],
+            ['featuresByCategory', 'Ogrzewanie']
+        ],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'okolica_json': {
+        'sources': [
+            ['other', 'Okolica'],
+            ['featuresByCategory', 'Okolica']
+        ],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'zabezpieczenia_json': {
+        'sources': [
+            ['other', 'Zabezpieczenia'],
+            ['featuresByCategory', 'Zabezpieczenia']
+        ],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'wyposazenie_json': {
+        'sources': [
+            ['other', 'Wyposaenie'],
+            ['featuresByCategory', 'Wyposaenie']
+        ],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'images': {
+        'sources': [['images_urls']],
+        'default': [],
+        'format': transformation.to_json_string
+    },
+    'contact': {'sources': [['contact']], 'format': transformation.to_json_string},
+    'owner': {'sources': [['owner']], 'format': transformation.to_json_string},
+}
+
 _linux = 'Mozilla/5.0 (X11; Linux x86_64; CentOS Ubuntu 19.04) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.5957.0 Safari/537.36'
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
@@ -391,6 +682,36 @@ IMG_HEADERS = {
     "Sec-Fetch-Site": "none",
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.4 Safari/605.1.15"
 }
+DOWNLOAD = {
+    'max_concurrency_per_host': 4,
+    'requests_per_second': 8,
+    'parallel_listing': True,
+    'timeout': 30,
+    'conditional_requests': True,
+    'chunk_size': 64 * 1024,
+    'probe_missing_offers': True
+}
+RETRY = {
+    'max_attempts': 4,
+    'backoff_base': 1.0,
+    'backoff_max': 30.0,
+    'retry_after_max': 120.0,
+    'statuses': [429, 500, 502, 503, 504]
+}
+CIRCUIT_BREAKER = {
+    'failure_threshold': 5,
+    'cooldown': 60.0
+}
+RATE_LIMIT = {
+    'initial_rate': 4,
+    'min_rate': 0.5,
+    'max_rate': 16,
+    'burst': 4,
+    'increase_step': 0.5,
+    'decrease_factor': 0.5,
+    'latency_factor': 3.0,
+    'latency_floor': 0.2
+}
 LOGGING = {
     'formatter': {
         'fmt': '{asctime}\t{levelname}\t{module}\t{funcName}\t{message}',
@@ -1,22 +1,34 @@
+from src.database import db
 from src.scraper.spider import Scraper_Service
 from src.watchman.watchdog import Watchdog
 
-houses_glogow_scraper = Scraper_Service(listing_for='houses_glogow')
-houses_glogow_scraper.run()
 
-houses_radwanice_scraper = Scraper_Service(listing_for='houses_radwanice')
-houses_radwanice_scraper.run()
+def main() -> None:
+    db.open_pool()
 
-flats_scraper = Scraper_Service(listing_for='flats')
-flats_scraper.run()
+    houses_glogow_scraper = Scraper_Service(listing_for='houses_glogow')
+    houses_glogow_scraper.run()
 
-# houses_radwanice_scraper.pick_up_tasks_manually()
+    houses_radwanice_scraper = Scraper_Service(listing_for='houses_radwanice')
+    houses_radwanice_scraper.run()
 
+    flats_scraper = Scraper_Service(listing_for='flats')
+    flats_scraper.run()
 
-w = Watchdog()
-w.download_images()
-w.clean_url_id_folders()
-w.notify_about_recent_good_offer()
+    # houses_radwanice_scraper.pick_up_tasks_manually()
+
+
+    w = Watchdog()
+    w.download_images()
+    w.clean_url_id_folders()
+    w.notify_about_recent_good_offer()
+
+    db.close_pool()
+
+
+# The parse pool spawns its workers, which import this module again
+if __name__ == '__main__':
+    main()
 
 
 # TODO: Batch check for images to download, skip already downloaded ones
@@ -1,9 +1,17 @@
+import atexit
+import json
 import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime as dt
+from hashlib import sha256
+from typing import Iterator
 
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 
-from src.database import queries
+from src.database import migrations, queries
 from src.utils.log_util import get_logger
 import config
 
@@ -11,16 +19,33 @@ import config
 log = get_logger(__name__, 30, True, True)
 
 
-PS = '%s' if config.OTODOM_DATABASE_TYPE == 'postgres' else '?'
+def _get_db_type(db_type: str|None = None) -> str:
+    """
+    The given database type or config.OTODOM_DATABASE_TYPE, lowercased for comparisons.
+    """
+    return (db_type or config.OTODOM_DATABASE_TYPE).strip().lower()
+
+
+PS = '%s' if _get_db_type() == 'postgres' else '?'
+DB_ERRORS = (sqlite3.Error, psycopg.Error)
+
+_pool: ConnectionPool|None = None
+_sqlite_conn: sqlite3.Connection|None = None
+_sqlite_lock = threading.RLock()
+_pool_lock = threading.Lock()
+_local = threading.local()
+_schema_checked = False
 
 
 def connect(db_type: str = config.OTODOM_DATABASE_TYPE) -> sqlite3.Connection | psycopg.Connection:
     """
     Connect to the database based on the provided type.
+    Opens a new, unpooled connection, prefer connection() or transaction().
     """
-    if db_type.lower() == 'postgres':
+    db_type = _get_db_type(db_type)
+    if db_type == 'postgres':
         return _connect_postgres()
-    elif db_type.lower() == 'sqlite':
+    elif db_type == 'sqlite':
         return _connect_sqlite()
     else:
         raise ValueError(f'Unsupported database type: {db_type}')
@@ -30,42 +55,201 @@ def _connect_postgres() -> psycopg.Connection:
     Connect to the PostgreSQL database.
     """
 
-    conn = psycopg.connect(
-        host=config.OTODOM_SERVER_NAME,
-        port=config.OTODOM_SERVER_PORT,
-        dbname=config.OTODOM_DATABASE_NAME,
-        user=config.OTODOM_USERNAME,
-        password=config.OTODOM_PASSWORD,
-        row_factory=dict_row,
-    )
-
-    cur = conn.cursor()
-    cur.execute(f'SET search_path TO {config.OTODOM_SCHEMA_NAME}')
+    conn = psycopg.connect(**_get_postgres_kwargs())
+    _configure_postgres(conn)
     return conn
 
 
+def _get_postgres_kwargs() -> dict[str, str|object]:
+    return {
+        'host': config.OTODOM_SERVER_NAME,
+        'port': config.OTODOM_SERVER_PORT,
+        'dbname': config.OTODOM_DATABASE_NAME,
+        'user': config.OTODOM_USERNAME,
+        'password': config.OTODOM_PASSWORD,
+        'row_factory': dict_row,
+    }
+
+
+def _configure_postgres(conn: psycopg.Connection) -> None:
+    """
+    Runs once per physical connection, the pool keeps the search_path afterwards.
+    """
+    conn.execute(f'SET search_path TO {config.OTODOM_SCHEMA_NAME}')
+    conn.commit()
+
+
 def _connect_sqlite() -> sqlite3.Connection:
     """
     Connect to the SQLite database.
     """
-    conn = sqlite3.connect(config.OTODOM_DATABASE_NAME)
+    conn = sqlite3.connect(
+        config.OTODOM_DATABASE_NAME,
+        timeout=config.SQLITE['timeout'],
+        cached_statements=config.SQLITE['cached_statements'],
+        check_same_thread=False,
+    )
     conn.row_factory = sqlite3.Row
+    _configure_sqlite(conn)
     return conn
 
 
+def _configure_sqlite(conn: sqlite3.Connection) -> None:
+    """
+    Apply config.SQLITE['pragmas']. WAL lets readers like the watchdog
+    run next to a writing scraper and, with synchronous=NORMAL,
+    syncs on checkpoints instead of on every commit.
+    """
+    for pragma, value in config.SQLITE['pragmas'].items():
+        conn.execute(f'PRAGMA {pragma} = {value}')
+
+
+def open_pool(db_type: str = config.OTODOM_DATABASE_TYPE) -> None:
+    """
+    Opens the Postgres connection pool or the shared SQLite connection.
+    Called lazily by connection(), calling it again is a no-op.
+    """
+    global _pool, _sqlite_conn
+    db_type = _get_db_type(db_type)
+    with _pool_lock:
+        if db_type == 'postgres':
+            if _pool is None:
+                _pool = ConnectionPool(
+                    kwargs=_get_postgres_kwargs(),
+                    configure=_configure_postgres,
+                    min_size=config.DB_POOL['min_size'],
+                    max_size=config.DB_POOL['max_size'],
+                    timeout=config.DB_POOL['timeout'],
+                    max_idle=config.DB_POOL['max_idle'],
+                    name='otodom',
+                    open=True,
+                )
+                log.debug(f'Opened connection pool {_pool.name}')
+        elif db_type == 'sqlite':
+            if _sqlite_conn is None:
+                _sqlite_conn = _connect_sqlite()
+                log.debug(f'Opened {config.OTODOM_DATABASE_NAME}')
+        else:
+            raise ValueError(f'Unsupported database type: {db_type}')
+
+
+def close_pool() -> None:
+    """
+    Closes the pool and the shared SQLite connection, registered with atexit.
+    """
+    global _pool, _sqlite_conn
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if _sqlite_conn is not None:
+            with _sqlite_lock:
+                _sqlite_conn.close()
+            _sqlite_conn = None
+
+
+atexit.register(close_pool)
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection | psycopg.Connection]:
+    """
+    Borrows a connection for the duration of the block.
+    Nested calls on the same thread get the same connection.
+    The SQLite connection is shared, so it is held under a lock.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        yield conn
+        return
+
+    if _pool is None and _sqlite_conn is None:
+        open_pool()
+    if _get_db_type() == 'postgres':
+        with _pool.connection() as conn:
+            _local.conn = conn
+            try:
+                yield conn
+            finally:
+                _local.conn = None
+    else:
+        with _sqlite_lock:
+            _local.conn = _sqlite_conn
+            try:
+                yield _sqlite_conn
+            finally:
+                _local.conn = None
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Cursor | psycopg.Cursor]:
+    """
+    Yields a cursor, commits when the outermost block exits
+    and rolls back if it raises.
+    """
+    with connection() as conn:
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            if depth == 0:
+                conn.commit()
+        except BaseException:
+            if depth == 0:
+                conn.rollback()
+            raise
+        finally:
+            _local.depth = depth
+            cursor.close()
+
+
+class Write_Batch:
+    """
+    Collects parametrized write statements and flushes them
+    with executemany in a single transaction, in the order they were first added.
+    Used as a context manager it flushes on exit and discards the writes on an error.
+    """
+    def __init__(self):
+        self.statements: dict[str, list[tuple]] = {}
+
+    def __enter__(self) -> 'Write_Batch':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            self.statements = {}
+
+    def __len__(self) -> int:
+        return sum([len(x) for x in self.statements.values()])
+
+    def add(self, query: str, data: tuple) -> None:
+        self.statements.setdefault(query, []).append(data)
+
+    def flush(self) -> int:
+        count = len(self)
+        if not count:
+            return 0
+        with transaction() as cursor:
+            for query, rows in self.statements.items():
+                cursor.executemany(query, rows)
+        self.statements = {}
+        log.debug(f'Flushed {count} writes')
+        return count
+
+
 def execute_with_return(query: str, data: tuple|None = None) -> list[dict[str, str]]:
     """
     Execute a query and return the result.
     """
-    conn = connect()
-    cursor = conn.cursor()
-    if data:
-        cursor.execute(query, data)
-    else:
-        cursor.execute(query)
-    rows = cursor.fetchall()
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        if data:
+            cursor.execute(query, data)
+        else:
+            cursor.execute(query)
+        rows = cursor.fetchall()
     return [{k: row[k] for k in row.keys()} for row in rows]
 
 def execute_no_return(query: str, data: tuple|None = None) -> None:
@@ -73,38 +257,85 @@ def execute_no_return(query: str, data: tuple|None = None) -> None:
     Execute a non-returning DDL query
     using the provided data tuple - if provided
     """
-    conn = connect()
-    cursor = conn.cursor()
-    if data:
-        cursor.execute(query, data)
-    else:
-        cursor.execute(query)
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        if data:
+            cursor.execute(query, data)
+        else:
+            cursor.execute(query)
+
+def insert_many(table: str, columns: list[str], rows: list[tuple]) -> int:
+    """
+    Insert all rows in one transaction,
+    with COPY on Postgres and executemany on SQLite.
+    """
+    if not rows:
+        return 0
+    with transaction() as cursor:
+        if _get_db_type() == 'postgres':
+            with cursor.copy(f'COPY {table} ({", ".join(columns)}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            cursor.executemany(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join([PS] * len(columns))})',
+                rows,
+            )
+    return len(rows)
+
+
+def sync_urls(urls: list[tuple[str, str]], run_id: int) -> dict[str, list[str]]:
+    """
+    Insert the (url_id, url) pairs of a run which have no active row in urls.
+    The pairs are loaded into a staging table and classified in one transaction.
+    Returns the url_ids grouped into new, revived (expired before) and active.
+    """
+    result = {'new': [], 'revived': [], 'active': []}
+    with transaction() as cursor:
+        cursor.execute(queries.Urls_Staging.DDL)
+        cursor.execute(queries.Urls_Staging.clear)
+        insert_many(queries.Urls_Staging.TABLE_NAME, queries.Urls_Staging.COLUMNS, urls)
+        cursor.execute(queries.Urls_Staging.classify)
+        rows = cursor.fetchall()
+        cursor.execute(queries.Urls_Staging.insert_missing, (run_id, run_id))
+        cursor.execute(queries.Urls_Staging.clear)
+    for row in rows:
+        if row['is_active']:
+            result['active'].append(row['url_id'])
+        elif row['was_expired']:
+            result['revived'].append(row['url_id'])
+        else:
+            result['new'].append(row['url_id'])
+    return result
+
 
 def create_tables():
     """
-    Create the audit_logs table and urls table if it doesn't exist.
+    Create the tables if they don't exist and apply the pending migrations.
+    Checked once per process, nothing is executed when the schema version is current,
+    so schema changes need a new migration.
     """
-    conn = connect()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(queries.Urls.DDL)
-        cursor.execute(queries.Audit_Logs.DDL)
-        cursor.execute(queries.Offers.DDL)
-        cursor.execute(queries.Favorites.DDL)
-        cursor.execute(queries.Normalized_Addresses.DDL)
-        cursor.execute(queries.Run_Logs.DDL)
-        cursor.execute(queries.Images.DDL)
-        cursor.execute(queries.Date_Dim.DDL)
-        cursor.execute(queries.Date_Dim.POPULATE)
-        cursor.execute(queries.Views.offers_with_history.DDL)
-        conn.commit()
-        conn.close()
-    except sqlite3.Error as exc:
-        conn.rollback()
-        conn.close()
-        raise exc from exc
+    global _schema_checked
+    if _schema_checked:
+        return
+    with transaction() as cursor:
+        if migrations.get_version(cursor) >= migrations.LATEST_VERSION:
+            log.debug(f'Schema version {migrations.LATEST_VERSION} is current')
+        else:
+            cursor.execute(queries.Urls.DDL)
+            cursor.execute(queries.Audit_Logs.DDL)
+            cursor.execute(queries.Http_Validators.DDL)
+            cursor.execute(queries.Offers.DDL)
+            cursor.execute(queries.Revisit_Schedule.DDL)
+            cursor.execute(queries.Favorites.DDL)
+            cursor.execute(queries.Normalized_Addresses.DDL)
+            cursor.execute(queries.Run_Logs.DDL)
+            cursor.execute(queries.Crawl_State.DDL)
+            cursor.execute(queries.Images.DDL)
+            cursor.execute(queries.Date_Dim.DDL)
+            cursor.execute(queries.Date_Dim.POPULATE)
+            cursor.execute(queries.Views.offers_with_history.DDL)
+            migrations.migrate(cursor)
+    _schema_checked = True
 
 
 def get(table: str, columns: list[str], filters: list[tuple[str, str|int]]|None = None) -> list[dict[str, str]]:
@@ -112,16 +343,14 @@ def get(table: str, columns: list[str], filters: list[tuple[str, str|int]]|None
     Get all active records from a table.
     """
     filter_clause = _get_filter_clause(filters)
-    conn = connect()
-    cursor = conn.cursor()
-    cursor.execute(f'''
-        SELECT {', '.join(columns)}
-        FROM {table}
-        WHERE status IN (1,2)
-        {filter_clause}
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute(f'''
+            SELECT {', '.join(columns)}
+            FROM {table}
+            WHERE status IN (1,2)
+            {filter_clause}
+        ''')
+        rows = cursor.fetchall()
     return [{k: row[k] for k in row.keys()} for row in rows]
 
 
@@ -135,52 +364,100 @@ def _get_filter_clause(filters: list[tuple[str, str|int]]|None) -> str:
     return filter_clause
 
 
-def upsert_offer(id4: str, entity: str, data: dict[str, str|int|None]) -> None:
-    conn = connect()
-    cursor = conn.cursor()
+def upsert_offer(id4: str, entity: str, data: dict[str, str|int|None]) -> int:
     data['url_id'] = id4
     data['entity'] = entity
 
-    if get('offers', ['id'], [('url_id', id4)]):
-        log.debug(f'SET HISTORICAL {id4}')
-        q = f'UPDATE offers SET status = 2 WHERE url_id = {PS}'
-        cursor.execute(q, (id4,))
-        conn.commit()
-
-    sqlite_placeholders = """
-        :url_id, :status, :entity, :city, :postal_code, :street, :price, :area, :price_per_m2, :floors, :floor, :rooms,
-        :build_year, :building_type, :building_material, :rent, :windows, :land_area, :construction_status, :market, :posted_by,
-        :coordinates_lat_lon, :informacje_dodatkowe_json, :media_json, :ogrodzenie_json, :dojazd_json,
-        :ogrzewanie_json, :okolica_json, :zabezpieczenia_json, :wyposazenie_json, :ground_plan, :images, :description,
-        :contact, :owner
-        """
-
-    psycopg_placeholders = r"""
-        %(url_id)s, %(status)s, %(entity)s, %(city)s, %(postal_code)s, %(street)s, %(price)s, %(area)s, %(price_per_m2)s, %(floors)s, %(floor)s, %(rooms)s,
-        %(build_year)s, %(building_type)s, %(building_material)s, %(rent)s, %(windows)s, %(land_area)s, %(construction_status)s, %(market)s, %(posted_by)s,
-        %(coordinates_lat_lon)s, %(informacje_dodatkowe_json)s, %(media_json)s, %(ogrodzenie_json)s, %(dojazd_json)s,
-        %(ogrzewanie_json)s, %(okolica_json)s, %(zabezpieczenia_json)s, %(wyposazenie_json)s, %(ground_plan)s, %(images)s, %(description)s,
-        %(contact)s, %(owner)s
-        """
-
-    insert_query = f"""
-    INSERT INTO offers (
-        url_id, status, entity, city, postal_code, street, price, area, price_per_m2, floors, floor, rooms,
-        build_year, building_type, building_material, rent, windows, land_area, construction_status, market, posted_by,
-        coordinates_lat_lon, informacje_dodatkowe_json, media_json, ogrodzenie_json, dojazd_json, ogrzewanie_json,
-        okolica_json, zabezpieczenia_json, wyposazenie_json, ground_plan, images, description, contact, owner
-    ) VALUES (
-        {psycopg_placeholders if config.OTODOM_DATABASE_TYPE == 'postgres' else sqlite_placeholders}
-    )
+    if failed := bulk_upsert_offers([data]):
+        log.warning(f'FAILED {id4}, {failed[id4]}')
+        return 0
+    log.debug(f'OK {id4}')
+    return 1
+
+
+def get_content_hash(offer: dict[str, str|int|None]) -> str:
+    """
+    Hash of the offer fields which make up a version, see Offers.CONTENT_COLUMNS.
     """
+    values = [offer.get(x) for x in queries.Offers.CONTENT_COLUMNS]
+    return sha256(json.dumps(values, default=str).encode()).hexdigest()
+
+
+def bulk_upsert_offers(offers: list[dict[str, str|int|None]]) -> dict[str, str]:
+    """
+    Insert a new version of the offers whose content hash differs from the active one,
+    set the previous version as historical and refresh offers_latest.
+    Unchanged offers only get last_seen_at updated. Runs through a staging table, in one transaction.
+    Every offer needs url_id and entity, last_seen_at defaults to now.
+    If the batch fails, the offers are retried one by one,
+    so a bad offer does not abort the others.
+    Returns the failed url_ids with their error message.
+    """
+    seen_at = dt.now().isoformat()
+    rows = {}
+    for offer in offers:
+        offer['content_hash'] = get_content_hash(offer)
+        offer['last_seen_at'] = offer.get('last_seen_at') or seen_at
+        rows[offer['url_id']] = tuple([offer.get(x) for x in queries.Offers.INSERT_COLUMNS])
+    if not rows:
+        return {}
+
+    failed = {}
+    with transaction() as cursor:
+        try:
+            with _savepoint(cursor, 'bulk_upsert_offers'):
+                cursor.execute(queries.Offers_Staging.DDL)
+                cursor.execute(queries.Offers_Staging.clear)
+                insert_many(
+                    queries.Offers_Staging.TABLE_NAME,
+                    queries.Offers.INSERT_COLUMNS,
+                    list(rows.values()),
+                )
+                cursor.execute(queries.Offers_Staging.touch_unchanged)
+                cursor.execute(queries.Offers_Staging.delete_unchanged)
+                cursor.execute(queries.Offers_Staging.set_historical)
+                cursor.execute(queries.Offers_Staging.insert_from_staging)
+                log.debug(f'{cursor.rowcount} of {len(rows)} offers changed')
+                cursor.execute(queries.Offers_Latest.upsert_from_staging)
+                cursor.execute(queries.Offers_Staging.clear)
+            return failed
+        except DB_ERRORS as exc:
+            if len(rows) > 1:
+                log.warning(f'Bulk upsert of {len(rows)} offers failed, retrying one by one: {exc}')
+
+        for url_id, row in rows.items():
+            offer = dict(zip(queries.Offers.INSERT_COLUMNS, row))
+            try:
+                with _savepoint(cursor, 'upsert_offer'):
+                    cursor.execute(
+                        queries.Offers.touch_unchanged,
+                        (offer['last_seen_at'], url_id, offer['content_hash']),
+                    )
+                    if cursor.rowcount:
+                        continue
+                    cursor.execute(queries.Offers.set_historical, (url_id,))
+                    cursor.execute(queries.Offers.insert, row)
+                    cursor.execute(queries.Offers_Latest.upsert_by_url_id, (url_id,))
+            except DB_ERRORS as exc:
+                failed[url_id] = str(exc)
+    return failed
+
+
+@contextmanager
+def _savepoint(cursor: sqlite3.Cursor | psycopg.Cursor, name: str) -> Iterator[None]:
+    """
+    Undo only the statements of the block if it raises,
+    leaving the surrounding transaction usable.
+    """
+    if isinstance(cursor, sqlite3.Cursor) and not cursor.connection.in_transaction:
+        # sqlite3 only begins implicitly before DML, a savepoint opened outside
+        # a transaction would start one that its RELEASE commits
+        cursor.execute('BEGIN')
+    cursor.execute(f'SAVEPOINT {name}')
     try:
-        cursor.execute(insert_query, data)
-        conn.commit()
-        log.debug(f'OK {id4}')
-        conn.close()
-        return 1
-    except sqlite3.Error as ex:
-        conn.rollback()
-        log.warning(f'FAILED {data["url_id"]}, {ex}')
-        conn.close()
-        return 0
+        yield
+    except BaseException:
+        cursor.execute(f'ROLLBACK TO SAVEPOINT {name}')
+        cursor.execute(f'RELEASE SAVEPOINT {name}')
+        raise
+    cursor.execute(f'RELEASE SAVEPOINT {name}')
@@ -0,0 +1,150 @@
+import sqlite3
+from typing import Callable
+
+import psycopg
+
+import config
+from src.database import queries
+from src.utils.log_util import get_logger
+
+
+log = get_logger(__name__, 30, True, True)
+log.setLevel(config.LOGGING['levels']['console'])
+
+
+Cursor = sqlite3.Cursor | psycopg.Cursor
+
+
+def _add_column_if_missing(table: str, column: str, definition: str) -> Callable[[Cursor], None]:
+    """
+    CREATE TABLE IF NOT EXISTS does not add columns to an existing table.
+    """
+    def step(cursor: Cursor) -> None:
+        if column in _get_columns(cursor, table):
+            return
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        log.info(f'Added column {table}.{column}')
+    return step
+
+
+def _create_index(name: str, table: str, columns: list[str]) -> Callable[[Cursor], None]:
+    """
+    Skips tables which are not created on this backend, e.g. notifications on SQLite.
+    """
+    def step(cursor: Cursor) -> None:
+        if not _get_columns(cursor, table):
+            log.warning(f'Skipped index {name}, table {table} does not exist')
+            return
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})')
+        log.info(f'Created index {name}')
+    return step
+
+
+def _execute(query: str) -> Callable[[Cursor], None]:
+    def step(cursor: Cursor) -> None:
+        cursor.execute(query)
+    return step
+
+
+def _get_columns(cursor: Cursor, table: str) -> list[str]:
+    cursor.execute(queries.Schema.get_columns, (table,))
+    return [row['column_name'] for row in cursor.fetchall()]
+
+
+MIGRATIONS: list[tuple[int, str, list[Callable[[Cursor], None]]]] = [
+    (1, 'Offer content hash and last seen marker', [
+        _add_column_if_missing(queries.Offers.TABLE_NAME, 'content_hash', 'TEXT NULL'),
+        _add_column_if_missing(queries.Offers.TABLE_NAME, 'last_seen_at', f'{queries.TIMESTAMP_TYPE} NULL'),
+    ]),
+    (2, 'Indexes on lookup and join columns', [
+        _create_index('urls_url_id_status_idx', queries.Urls.TABLE_NAME, ['url_id', 'status']),
+        _create_index('offers_url_id_created_at_idx', queries.Offers.TABLE_NAME, ['url_id', 'created_at']),
+        _create_index('audit_logs_url_id_idx', queries.Audit_Logs.TABLE_NAME, ['url_id']),
+        _create_index('audit_logs_run_id_idx', queries.Audit_Logs.TABLE_NAME, ['run_id']),
+        _create_index(
+            'normalized_addresses_url_id_coordinates_idx',
+            queries.Normalized_Addresses.TABLE_NAME,
+            ['url_id', 'coordinates_lat_lon'],
+        ),
+        _create_index('notifications_url_id_price_idx', queries.Notifications.TABLE_NAME, ['url_id', 'price']),
+    ]),
+    (3, 'Latest offer version table maintained on upsert', [
+        _execute(queries.Offers_Latest.DDL),
+        _execute(queries.Offers_Latest.idx),
+        _execute(f'DELETE FROM {queries.Offers_Latest.TABLE_NAME}'),
+        _execute(queries.Offers_Latest.BACKFILL),
+        _execute(queries.Offers_Latest.VIEW_DDL),
+    ]),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# (name, query, data, indexes any of which the plan should use)
+HOT_QUERIES: list[tuple[str, str, tuple, list[str]]] = [
+    ('urls status update', queries.Urls.update_status, (1, 1, None, ''), ['urls_url_id_status_idx']),
+    ('urls status lookup', queries.Urls.get_status, ('',), ['urls_url_id_status_idx']),
+    ('offer historicise', queries.Offers.set_historical, ('',), ['offers_url_id_created_at_idx']),
+    ('offer unchanged touch', queries.Offers.touch_unchanged, (None, '', ''), ['offers_url_id_created_at_idx']),
+    ('latest offer refresh', queries.Offers_Latest.upsert_by_url_id, ('',), ['offers_url_id_created_at_idx']),
+    ('revisit schedule of entity', queries.Revisit_Schedule.get_by_entity, ('',), ['urls_url_id_status_idx']),
+    ('addresses to add', queries.Normalized_Addresses.get_coordinates_to_add, (), [
+        'normalized_addresses_url_id_coordinates_idx',
+        'sqlite_autoindex_normalized_addresses_1',
+        'normalized_addresses_url_id_street_coordinates_lat_lon_key',
+    ]),
+]
+
+
+def get_version(cursor: Cursor) -> int:
+    cursor.execute(queries.Schema_Version.DDL)
+    cursor.execute(queries.Schema_Version.get_current)
+    return cursor.fetchone()['version']
+
+
+def migrate(cursor: Cursor) -> int:
+    """
+    Apply the migrations newer than the recorded schema version, in order.
+    Every step is idempotent, so a migration interrupted before
+    its version was recorded can run again.
+    Returns the schema version.
+    """
+    version = get_version(cursor)
+    for number, description, steps in MIGRATIONS:
+        if number <= version:
+            continue
+        for step in steps:
+            step(cursor)
+        cursor.execute(queries.Schema_Version.insert, (number, description))
+        log.info(f'Schema migrated to version {number}: {description}')
+        version = number
+    return version
+
+
+def check_indexes(cursor: Cursor) -> dict[str, bool]:
+    """
+    EXPLAIN the hot queries and report whether their plan uses one of the expected indexes.
+    Sequential scans are disabled on Postgres for the check,
+    small tables would make the planner skip any index.
+    """
+    if config.OTODOM_DATABASE_TYPE.lower() == 'postgres':
+        cursor.execute('SET LOCAL enable_seqscan = off')
+    result = {}
+    for name, query, data, indexes in HOT_QUERIES:
+        if data:
+            cursor.execute(queries.Schema.explain + query, data)
+        else:
+            cursor.execute(queries.Schema.explain + query)
+        plan = ' '.join([str(value) for row in cursor.fetchall() for value in dict(row).values()])
+        result[name] = any([index in plan for index in indexes])
+        if not result[name]:
+            log.warning(f'{name} does not use {", ".join(indexes)}: {plan}')
+    return result
+
+
+if __name__ == '__main__':
+    from src.database import db
+
+    db.create_tables()
+    with db.transaction() as cursor:
+        print(f'Schema version {get_version(cursor)}')
+        for name, uses_index in check_indexes(cursor).items():
+            print(f'{"OK" if uses_index else "NO INDEX"}\t{name}')
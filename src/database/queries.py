@@ -20,6 +20,7 @@ CAST_DATE_PARTS = (
 )
 CAST_CALENDAR_WEEK = "CAST(strftime('%W', date) AS INTEGER)" if OTODOM_DATABASE_TYPE.lower() == 'sqlite' else "EXTRACT(WEEK FROM date)"
 CREATE_VIEW_CLAUSE = "CREATE VIEW IF NOT EXISTS" if OTODOM_DATABASE_TYPE.lower() == 'sqlite' else "CREATE OR REPLACE VIEW"
+IS_DISTINCT_FROM = 'IS NOT' if OTODOM_DATABASE_TYPE.lower() == 'sqlite' else 'IS DISTINCT FROM'
 COORDINATES_SPLIT_EXPRESSION = "split_part(v.coordinates_lat_lon, ',', 1)::FLOAT" if OTODOM_DATABASE_TYPE.lower() == 'postgres' else "CAST(SUBSTR(v.coordinates_lat_lon, 1, INSTR(v.coordinates_lat_lon, ',') - 1) AS FLOAT)"
 
 
@@ -67,26 +68,6 @@ class Urls:
         ORDER BY id DESC
         LIMIT 1;
     """
-    create_if_not_exists = f"""
-        WITH check_existence AS (
-            SELECT 1 AS exists_flag
-            FROM {TABLE_NAME}
-            WHERE url_id = {PS}
-            AND status = 2
-            LIMIT 1
-        )
-        INSERT INTO {TABLE_NAME} (url_id, url, status, created_run_id, updated_run_id)
-        SELECT 
-            {PS} as url_id,
-            {PS} as url,
-            {PS} as status,
-            {PS} as created_run_id,
-            {PS} as updated_run_id
-        WHERE NOT EXISTS (
-            SELECT 1 FROM {TABLE_NAME} WHERE url_id = {PS} AND status = 1)
-        RETURNING
-            COALESCE((SELECT exists_flag FROM check_existence), 0) AS existence_flag;
-    """
     update_status = f"""
         UPDATE {TABLE_NAME}
         SET status = {PS}, updated_run_id = {PS}, expired_run_id = {PS}
@@ -101,10 +82,89 @@ class Urls:
     """
 
 
+class Urls_Staging:
+    TABLE_NAME = 'urls_staging'
+    COLUMNS = ['url_id', 'url']
+    DDL = f"""
+        CREATE TEMP TABLE IF NOT EXISTS {TABLE_NAME} (
+            url_id TEXT NOT NULL,
+            url TEXT NOT NULL
+        );
+    """
+    clear = f"""
+        DELETE FROM {TABLE_NAME};
+    """
+    classify = f"""
+        SELECT
+            s.url_id,
+            MAX(CASE WHEN u.status = 1 THEN 1 ELSE 0 END) AS is_active,
+            MAX(CASE WHEN u.status = 2 THEN 1 ELSE 0 END) AS was_expired
+        FROM (SELECT DISTINCT url_id FROM {TABLE_NAME}) s
+        LEFT OUTER JOIN {Urls.TABLE_NAME} u ON u.url_id = s.url_id
+        GROUP BY s.url_id
+    """
+    insert_missing = f"""
+        INSERT INTO {Urls.TABLE_NAME} (url_id, url, status, created_run_id, updated_run_id)
+        SELECT s.url_id, MIN(s.url), 1, {PS}, {PS}
+        FROM {TABLE_NAME} s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {Urls.TABLE_NAME} u WHERE u.url_id = s.url_id AND u.status = 1)
+        GROUP BY s.url_id
+    """
+
+
+class Schema:
+    get_columns = (
+        "SELECT name AS column_name FROM pragma_table_info(?)"
+        if OTODOM_DATABASE_TYPE.lower() == 'sqlite' else
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = %s"
+    )
+
+    explain = 'EXPLAIN QUERY PLAN ' if OTODOM_DATABASE_TYPE.lower() == 'sqlite' else 'EXPLAIN '
+
+
+class Schema_Version:
+    TABLE_NAME = 'schema_version'
+    DDL = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at {TIMESTAMP_TYPE} NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+    get_current = f"""
+        SELECT COALESCE(MAX(version), 0) AS version
+        FROM {TABLE_NAME}
+    """
+    insert = f"""
+        INSERT INTO {TABLE_NAME} (version, description)
+        VALUES ({PS}, {PS})
+    """
+
+
+class Crawl_State:
+    TABLE_NAME = 'crawl_state'
+    DDL = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            entity TEXT PRIMARY KEY,
+            last_full_crawl_at {TIMESTAMP_TYPE} NOT NULL
+        );
+    """
+    get_last_full_crawl = f"""
+        SELECT last_full_crawl_at
+        FROM {TABLE_NAME}
+        WHERE entity = {PS}
+    """
+    set_last_full_crawl = f"""
+        INSERT INTO {TABLE_NAME} (entity, last_full_crawl_at)
+        VALUES ({PS}, {PS})
+        ON CONFLICT (entity) DO UPDATE SET
+            last_full_crawl_at = excluded.last_full_crawl_at;
+    """
+
+
 class Audit_Logs:
     TABLE_NAME = 'audit_logs'
-    idx = f'CREATE INDEX IF NOT EXISTS audit_logs_url_id_idx ON {TABLE_NAME} (url_id);' if OTODOM_DATABASE_TYPE.lower() == 'postgres' else ''
-    idx2= f'CREATE INDEX IF NOT EXISTS audit_logs_run_id_idx ON {TABLE_NAME} (run_id);' if OTODOM_DATABASE_TYPE.lower() == 'postgres' else ''
     DDL = f"""
         CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
             id INTEGER PRIMARY KEY {IDENTITY_CLAUSE},
@@ -118,9 +178,8 @@ class Audit_Logs:
             error_step TEXT NULL,
             error_message TEXT NULL
         );
-        {idx}
-        {idx2}
     """
+    CREATE_LOG_COLUMNS = ['run_id', 'url_id', 'html_file_path', 'created_at']
     create_log = f"""
         INSERT INTO {TABLE_NAME} (run_id, url_id, html_file_path, created_at) VALUES
             ({PS}, {PS}, {PS}, {PS});
@@ -155,6 +214,32 @@ class Audit_Logs:
     """
 
 
+class Http_Validators:
+    TABLE_NAME = 'http_validators'
+    DDL = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            url TEXT PRIMARY KEY,
+            etag TEXT NULL,
+            last_modified TEXT NULL,
+            body_hash TEXT NULL,
+            updated_at {TIMESTAMP_TYPE} NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+    get_all = f"""
+        SELECT url, etag, last_modified, body_hash
+        FROM {TABLE_NAME}
+    """
+    upsert = f"""
+        INSERT INTO {TABLE_NAME} (url, etag, last_modified, body_hash, updated_at)
+        VALUES ({PS}, {PS}, {PS}, {PS}, CURRENT_TIMESTAMP)
+        ON CONFLICT (url) DO UPDATE SET
+            etag = excluded.etag,
+            last_modified = excluded.last_modified,
+            body_hash = excluded.body_hash,
+            updated_at = excluded.updated_at;
+    """
+
+
 class Favorites:
     TABLE_NAME = 'favorites'
     DDL = f"""
@@ -168,7 +253,6 @@ class Favorites:
 
 class Offers:
     TABLE_NAME = 'offers'
-    idx = f'CREATE INDEX IF NOT EXISTS offers_url_id_idx ON {TABLE_NAME} (url_id);' if OTODOM_DATABASE_TYPE.lower() == 'postgres' else ''
     DDL = f"""
         CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
             id INTEGER PRIMARY KEY {IDENTITY_CLAUSE},
@@ -207,10 +291,135 @@ class Offers:
             description TEXT NULL,
             contact TEXT NOT NULL,
             "owner" TEXT NULL,
-            created_at {TIMESTAMP_TYPE} NULL DEFAULT CURRENT_TIMESTAMP
+            created_at {TIMESTAMP_TYPE} NULL DEFAULT CURRENT_TIMESTAMP,
+            content_hash TEXT NULL,
+            last_seen_at {TIMESTAMP_TYPE} NULL
         );
-        {idx}
+    """
+    CONTENT_COLUMNS = [
+        'status', 'city', 'postal_code', 'street', 'price', 'area', 'price_per_m2', 'floors',
+        'floor', 'rooms', 'build_year', 'building_type', 'building_material', 'rent', 'windows', 'land_area',
+        'construction_status', 'market', 'posted_by', 'coordinates_lat_lon', 'informacje_dodatkowe_json',
+        'media_json', 'ogrodzenie_json', 'dojazd_json', 'ogrzewanie_json', 'okolica_json', 'zabezpieczenia_json',
+        'wyposazenie_json', 'ground_plan', 'images', 'description', 'contact', 'owner'
+    ]
+    INSERT_COLUMNS = ['url_id', 'entity'] + CONTENT_COLUMNS + ['content_hash', 'last_seen_at']
+    insert = f"""
+        INSERT INTO {TABLE_NAME} ({', '.join(INSERT_COLUMNS)})
+        VALUES ({', '.join([PS] * len(INSERT_COLUMNS))})
+    """
+    set_historical = f"""
+        UPDATE {TABLE_NAME}
+        SET status = 2
+        WHERE url_id = {PS}
+    """
+    touch_unchanged = f"""
+        UPDATE {TABLE_NAME}
+        SET last_seen_at = {PS}
+        WHERE url_id = {PS}
+          AND status = 1
+          AND content_hash = {PS}
+    """
+    get_latest_summaries = f"""
+        SELECT url_id, price, area, rooms
+        FROM {TABLE_NAME}
+        WHERE status = 1
+          AND entity = {PS}
+    """
+
 
+class Offers_Staging:
+    TABLE_NAME = 'offers_staging'
+    DDL = f"""
+        CREATE TEMP TABLE IF NOT EXISTS {TABLE_NAME} AS
+        SELECT {', '.join(Offers.INSERT_COLUMNS)}
+        FROM {Offers.TABLE_NAME}
+        WHERE 1 = 0;
+    """
+    clear = f"""
+        DELETE FROM {TABLE_NAME};
+    """
+    touch_unchanged = f"""
+        UPDATE {Offers.TABLE_NAME}
+        SET last_seen_at = (
+            SELECT MAX(s.last_seen_at) FROM {TABLE_NAME} s WHERE s.url_id = {Offers.TABLE_NAME}.url_id)
+        WHERE status = 1
+          AND EXISTS (
+            SELECT 1 FROM {TABLE_NAME} s
+            WHERE s.url_id = {Offers.TABLE_NAME}.url_id
+              AND s.content_hash = {Offers.TABLE_NAME}.content_hash)
+    """
+    delete_unchanged = f"""
+        DELETE FROM {TABLE_NAME}
+        WHERE EXISTS (
+            SELECT 1 FROM {Offers.TABLE_NAME} o
+            WHERE o.url_id = {TABLE_NAME}.url_id
+              AND o.status = 1
+              AND o.content_hash = {TABLE_NAME}.content_hash)
+    """
+    set_historical = f"""
+        UPDATE {Offers.TABLE_NAME}
+        SET status = 2
+        WHERE url_id IN (SELECT url_id FROM {TABLE_NAME})
+    """
+    insert_from_staging = f"""
+        INSERT INTO {Offers.TABLE_NAME} ({', '.join(Offers.INSERT_COLUMNS)})
+        SELECT {', '.join(Offers.INSERT_COLUMNS)}
+        FROM {TABLE_NAME}
+    """
+
+
+class Revisit_Schedule:
+    TABLE_NAME = 'revisit_schedule'
+    DDL = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            url_id TEXT PRIMARY KEY,
+            next_check_at {TIMESTAMP_TYPE} NOT NULL,
+            interval_hours NUMERIC NOT NULL,
+            updated_at {TIMESTAMP_TYPE} NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+    get_by_entity = f"""
+        SELECT s.url_id, s.next_check_at
+        FROM {TABLE_NAME} s
+        WHERE EXISTS (
+            SELECT 1
+            FROM {Urls.TABLE_NAME} u
+            JOIN {Run_Logs.TABLE_NAME} r ON r.id = u.created_run_id
+            WHERE u.url_id = s.url_id
+              AND r.entity = {PS}
+        )
+    """
+    upsert = f"""
+        INSERT INTO {TABLE_NAME} (url_id, next_check_at, interval_hours, updated_at)
+        VALUES ({PS}, {PS}, {PS}, CURRENT_TIMESTAMP)
+        ON CONFLICT (url_id) DO UPDATE SET
+            next_check_at = excluded.next_check_at,
+            interval_hours = excluded.interval_hours,
+            updated_at = excluded.updated_at;
+    """
+    get_change_history = f"""
+        -- Per offer: first version, number of price or content changes and the last change
+        WITH versions AS (
+            SELECT
+                url_id,
+                created_at,
+                ROW_NUMBER() OVER(PARTITION BY url_id ORDER BY created_at, id) AS version_no,
+                CASE
+                    WHEN price {IS_DISTINCT_FROM} LAG(price) OVER(PARTITION BY url_id ORDER BY created_at, id)
+                      OR description {IS_DISTINCT_FROM} LAG(description) OVER(PARTITION BY url_id ORDER BY created_at, id)
+                    THEN 1 ELSE 0
+                END AS is_changed
+            FROM {Offers.TABLE_NAME}
+            WHERE entity = {PS}
+        )
+        SELECT
+            url_id,
+            MIN(created_at) AS first_seen_at,
+            SUM(CASE WHEN version_no > 1 THEN is_changed ELSE 0 END) AS changes,
+            MAX(CASE WHEN version_no > 1 AND is_changed = 1 THEN created_at END) AS last_changed_at
+        FROM versions
+        GROUP BY url_id
     """
 
 
@@ -289,6 +498,69 @@ class Normalized_Addresses:
     """
 
 
+class Offers_Latest:
+    TABLE_NAME = 'offers_latest'
+    VIEW_NAME = 'v_offers_latest'
+    COLUMNS = ['url_id', 'entity'] + Offers.CONTENT_COLUMNS + ['created_at']
+    DDL = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} AS
+        SELECT
+            id AS offer_id,
+            {', '.join(COLUMNS)},
+            price AS price_previous,
+            price AS price_diff
+        FROM {Offers.TABLE_NAME}
+        WHERE 1 = 0;
+    """
+    idx = f'CREATE UNIQUE INDEX IF NOT EXISTS offers_latest_url_id_idx ON {TABLE_NAME} (url_id);'
+    BACKFILL = f"""
+        INSERT INTO {TABLE_NAME} (offer_id, {', '.join(COLUMNS)}, price_previous, price_diff)
+        SELECT id, {', '.join(COLUMNS)}, price_previous, price_previous - price
+        FROM (
+            SELECT
+                o.*,
+                ROW_NUMBER() OVER(PARTITION BY url_id ORDER BY created_at DESC, id DESC) AS most_recent_order,
+                LAG(price) OVER(PARTITION BY url_id ORDER BY created_at, id) AS price_previous
+            FROM {Offers.TABLE_NAME} o
+        ) v
+        WHERE most_recent_order = 1
+    """
+    _upsert = f"""
+        INSERT INTO {TABLE_NAME} (offer_id, {', '.join(COLUMNS)}, price_previous, price_diff)
+        SELECT id, {', '.join(COLUMNS)}, NULL, NULL
+        FROM {Offers.TABLE_NAME}
+        WHERE id IN (
+            SELECT MAX(id) FROM {Offers.TABLE_NAME} WHERE url_id IN ({{url_ids}}) GROUP BY url_id)
+        ON CONFLICT (url_id) DO UPDATE SET
+            offer_id = excluded.offer_id,
+            {', '.join([f'{x} = excluded.{x}' for x in COLUMNS[1:]])},
+            price_previous = {TABLE_NAME}.price,
+            price_diff = {TABLE_NAME}.price - excluded.price
+    """
+    upsert_from_staging = _upsert.format(url_ids=f'SELECT url_id FROM {Offers_Staging.TABLE_NAME}')
+    upsert_by_url_id = _upsert.format(url_ids=PS)
+    VIEW_DDL = f"""
+        {CREATE_VIEW_CLAUSE} {VIEW_NAME} AS
+        SELECT
+            1 AS most_recent_order,
+            l.offer_id AS id,
+            l.url_id,
+            l.status,
+            l.entity,
+            l.city,
+            COALESCE(na.postal_code, l.postal_code) AS postal_code,
+            COALESCE(l.street, na.street) AS street,
+            l.price,
+            l.price_diff,
+            l.price_previous,
+            {', '.join([f'l.{x}' for x in Offers.CONTENT_COLUMNS[5:]])},
+            l.created_at,
+            na.maps_url
+        FROM {TABLE_NAME} l
+        LEFT OUTER JOIN {Normalized_Addresses.TABLE_NAME} na ON na.url_id = l.url_id
+    """
+
+
 class Notifications:
     TABLE_NAME = 'notifications'
     DDL = f'''
@@ -514,20 +786,18 @@ class Views:
             order by o.url_id desc, o.created_at desc;
 '''
     get_all_images_to_download = f"""
-        SELECT DISTINCT o.url_id, o.images
-        FROM {offers_with_previous_price.TABLE_NAME} o
-        LEFT JOIN images i ON i.url_id = o.url_id
+        SELECT o.url_id, o.images
+        FROM {Offers_Latest.TABLE_NAME} o
         WHERE o.images IS NOT null
-          and o.most_recent_order = 1
           and o.status = 1
     """
 
 class Watchdog:
     get_new_interesting_offers_last_1_day = f"""
-        SELECT DISTINCT v.most_recent_order, u.url_id, v.url, v.status, v.entity, v.city, v.street, v.price, v.price_per_m2, v.area, v.rooms, v.floor, v.maps_url, v.created_at
-        FROM v_offers_change_history_all v
+        SELECT DISTINCT v.most_recent_order, u.url_id, u.url, v.status, v.entity, v.city, v.street, v.price, v.price_per_m2, v.area, v.rooms, v.floor, v.maps_url, rl.started_at AS created_at
+        FROM {Offers_Latest.VIEW_NAME} v
         LEFT OUTER JOIN urls u ON u.url_id = v.url_id
-        LEFT OUTER JOIN run_logs rl ON rl.id = v.created_run_id  
+        LEFT OUTER JOIN run_logs rl ON rl.id = u.created_run_id
         WHERE rl.started_at > {PAST_DAY_DECREMENT}
         AND v.construction_status IN ('ready_to_use', 'to_completion')
         AND (LOWER(v.building_type) <> 'ribbon' OR v.building_type IS NULL)
@@ -554,9 +824,10 @@ class Watchdog:
         AND v.status = 1
     """
     get_all_interesting_offers_incl_expired = f"""
-        SELECT DISTINCT v.most_recent_order, u.url_id, v.url, v.status, v.entity, v.city, v.street, v.price, v.price_per_m2, v.area, v.rooms, v.floor, v.maps_url, v.created_at
-        FROM v_offers_change_history_all v
+        SELECT DISTINCT v.most_recent_order, u.url_id, u.url, v.status, v.entity, v.city, v.street, v.price, v.price_per_m2, v.area, v.rooms, v.floor, v.maps_url, rl.started_at AS created_at
+        FROM {Offers_Latest.VIEW_NAME} v
         LEFT OUTER JOIN urls u ON u.url_id = v.url_id
+        LEFT OUTER JOIN run_logs rl ON rl.id = u.created_run_id
         WHERE v.construction_status IN ('ready_to_use', 'to_completion')
         AND (LOWER(v.building_type) <> 'ribbon' OR v.building_type IS NULL)
         AND v.most_recent_order = 1
@@ -579,16 +850,15 @@ class Watchdog:
             OR (v.rooms > 3 AND v.entity = 'houses_radwanice' AND v.price < 350000)
             OR (v.rooms = -1)
         )
-        ORDER BY v.created_at DESC, v.most_recent_order ASC, v.price_per_m2 ASC
+        ORDER BY created_at DESC, v.most_recent_order ASC, v.price_per_m2 ASC
     """
 
     get_most_recent_interesting_offers = f'''
         select v.*, u.url
-        from {Views.offers_with_previous_price.TABLE_NAME} v
+        from {Offers_Latest.VIEW_NAME} v
         left outer join urls u on u.url_id = v.url_id and u.status = 1
         left outer join notifications n on n.url_id = v.url_id and n.price = v.price
-        where v.most_recent_order IN (1, 2, 3, 4)
-            and v.created_at > CURRENT_TIMESTAMP - INTERVAL '1 day'
+        where v.created_at > CURRENT_TIMESTAMP - INTERVAL '1 day'
             and v.status = 1
             AND (v.construction_status IN ('ready_to_use', 'to_completion') OR v.construction_status IS NULL)
             --AND (LOWER(v.building_type) <> 'ribbon' OR v.building_type IS NULL)
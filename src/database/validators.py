@@ -0,0 +1,46 @@
+import threading
+
+from src.database import db, queries
+
+
+class Validator_Store:
+    """
+    Keeps the HTTP validators (ETag, Last-Modified, body hash) per URL
+    in the http_validators table.
+
+    All validators are loaded once on first use and kept in memory.
+    Thread-safe.
+    """
+    def __init__(self):
+        self.__validators: dict[str, dict[str, str|None]]|None = None
+        self.__lock = threading.Lock()
+
+    def get(self, url: str) -> dict[str, str|None]|None:
+        with self.__lock:
+            return self.__load().get(url)
+
+    def save(self, validators_by_url: dict[str, dict[str, str|None]]) -> None:
+        """
+        Upserts the validators of the urls in one batch. Called within
+        a db.transaction() block, they are committed or rolled back with it.
+        """
+        with db.Write_Batch() as batch:
+            for url, validators in validators_by_url.items():
+                batch.add(
+                    queries.Http_Validators.upsert,
+                    (url, validators.get('etag'), validators.get('last_modified'), validators.get('body_hash'))
+                )
+        with self.__lock:
+            self.__load().update(validators_by_url)
+
+    def __load(self) -> dict[str, dict[str, str|None]]:
+        if self.__validators is None:
+            self.__validators = {
+                row['url']: {
+                    'etag': row['etag'],
+                    'last_modified': row['last_modified'],
+                    'body_hash': row['body_hash']
+                }
+                for row in db.execute_with_return(queries.Http_Validators.get_all)
+            }
+        return self.__validators
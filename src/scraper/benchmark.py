@@ -0,0 +1,371 @@
+"""
+Parse benchmarks on saved listing and detail pages.
+
+    python -m src.scraper.benchmark [--limit N] [--repeat N] [paths ...]
+
+paths are HTML files or folders searched recursively, config.SOURCE_FOLDER by default.
+tests/fixtures/pages has a trimmed listing and detail page to run them on
+without a crawl, real detail pages carry much more markup before __NEXT_DATA__.
+Benchmarks with a reference implementation check that it gives identical output.
+"""
+import argparse
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable
+
+import config
+from src.scraper import hierarchies, mapping, parser
+from src.scraper.extraction import Page_Processor
+from src.scraper.spider import extract_offer
+from src.utils.file_utils import File_Util
+
+
+DETAILS_HIERARCHY = hierarchies.OFFER_DETAILS[0]
+
+
+def get_pages(paths: list[str], limit: int|None = None) -> list[Path]:
+    pages = []
+    for path in [Path(x) for x in paths or [config.SOURCE_FOLDER]]:
+        pages.extend(sorted(path.rglob('*.html')) if path.is_dir() else [path])
+    return pages[:limit]
+
+
+def time_it(func: Callable[[Path], Any], pages: list[Path], repeat: int) -> tuple[float, list[Any]]:
+    """
+    Returns the best total time of repeat runs over all pages and the results of the last one.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        results = [func(page) for page in pages]
+        best = min(best, perf_counter() - start)
+    return best, results
+
+
+def report(name: str, timings: dict[str, float], pages: list[Any], baseline: str, unit: str = 'page') -> None:
+    print(f'\n{name}, {len(pages)} {unit}s')
+    for label, seconds in timings.items():
+        speedup = timings[baseline] / seconds if seconds else float('inf')
+        print(f'  {label:<24}{seconds * 1000 / len(pages):>10.3f} ms/{unit}{len(pages) / seconds:>10.1f} {unit}s/s{speedup:>8.1f}x')
+
+
+def benchmark_next_data(pages: list[Path], repeat: int) -> bool:
+    """
+    Soup tree walk against the byte-level __NEXT_DATA__ scan.
+    """
+    processor = Page_Processor()
+
+    def soup(page: Path) -> Any:
+        html = File_Util.read_file(str(page))
+        return processor.get_item_from(processor.make_soup(html), DETAILS_HIERARCHY)
+
+    def next_data(page: Path) -> Any:
+        return processor.get_offer_details(str(page), DETAILS_HIERARCHY)
+
+    soup_time, expected = time_it(soup, pages, repeat)
+    scan_time, actual = time_it(next_data, pages, repeat)
+    report('__NEXT_DATA__ extraction', {'soup': soup_time, 'byte scan': scan_time}, pages, 'soup')
+    mismatches = [str(page) for page, x, y in zip(pages, expected, actual) if x != y]
+    for page in mismatches:
+        print(f'  MISMATCH {page}')
+    return not mismatches
+
+
+def benchmark_parsers(pages: list[Path], repeat: int) -> bool:
+    """
+    get_links, get_pagination and get_item_from on every installed parser backend,
+    against html.parser. Throughput only, tests/test_parser_backends.py checks
+    that the backends give the same results.
+    """
+    htmls = {page: File_Util.read_file(str(page)) for page in pages}
+    processors = {}
+    for backend in Page_Processor.PARSER_BACKENDS:
+        try:
+            processors[backend] = Page_Processor(parser_backend=backend)
+        except ImportError as exc:
+            print(f'  SKIP {backend}: {exc}')
+
+    def parse(processor: Page_Processor) -> Callable[[Path], None]:
+        def run(page: Path) -> None:
+            html = htmls[page]
+            call(processor.get_links, html)
+            call(processor.get_pagination, html)
+            call(lambda x: processor.get_item_from(processor.make_soup(x), DETAILS_HIERARCHY), html)
+        return run
+
+    timings = {backend: time_it(parse(processor), pages, repeat)[0] for backend, processor in processors.items()}
+    report('Parser backends', timings, pages, 'html.parser')
+    return True
+
+
+def benchmark_hierarchies(pages: list[Path], repeat: int) -> bool:
+    """
+    The hierarchy dicts walked stage by stage, as before they were compiled,
+    against the compiled accessors, on soups and offer JSON built up front.
+    """
+    processor = Page_Processor()
+    soups = {page: processor.make_soup(File_Util.read_file(str(page))) for page in pages}
+    details = {page: call(lambda x: processor.get_offer_details(str(x), DETAILS_HIERARCHY), page) for page in pages}
+    listing = {
+        'pagination': (config.HIERARCHIES['pagination'], hierarchies.PAGINATION),
+        'offer_links': (config.HIERARCHIES['offer_links'], hierarchies.OFFER_LINKS),
+    }
+
+    def walked(page: Path) -> dict[str, Any]:
+        result = {name: call(lambda x: walk(x, hierarchy), soups[page]) for name, (hierarchy, _) in listing.items()}
+        if isinstance(details[page], dict):
+            for name, hierarchy in config.HIERARCHY_DETAILS.items():
+                result[name] = call(lambda x: walk(x, hierarchy, with_transformation=True), details[page])
+        return result
+
+    def compiled(page: Path) -> dict[str, Any]:
+        result = {name: call(accessor, soups[page]) for name, (_, accessor) in listing.items()}
+        if isinstance(details[page], dict):
+            for name, accessor in hierarchies.DETAILS.items():
+                result[name] = call(accessor, details[page])
+        return result
+
+    walk_time, expected = time_it(walked, pages, repeat)
+    compiled_time, actual = time_it(compiled, pages, repeat)
+    report('Hierarchy accessors', {'walk': walk_time, 'compiled': compiled_time}, pages, 'walk')
+    mismatches = [str(page) for page, x, y in zip(pages, expected, actual) if x != y]
+    for page in mismatches:
+        print(f'  MISMATCH {page}')
+    return not mismatches
+
+
+def walk(item: Any, hierarchy: dict[str, Any], with_transformation: bool = False) -> Any:
+    """
+    Reference walk of a hierarchy dict.
+    """
+    for stage in hierarchy['stages']:
+        for path in stage['path']:
+            tag, attributes = list(path.items())[0]
+            if stage['input'] == 'json':
+                item = item.get(tag, None)
+                continue
+            item = item.find(tag, attributes)
+            if not item:
+                raise ValueError(f"Tag {tag} with attributes {attributes} not found in the soup.")
+        if stage.get('transformation'):
+            item = stage['transformation'](item.text)
+    if with_transformation and hierarchy.get('transformation'):
+        item = hierarchy['transformation'](item, hierarchy.get('attributes'))
+    return item
+
+
+def benchmark_offer_fields(pages: list[Path], repeat: int) -> bool:
+    """
+    The compiled config.OFFER_FIELDS mapping against the reference or-chains,
+    on the offers extracted from detail pages and on copies of them with each
+    top level field removed in turn, to reach the fallback sources.
+    Inputs the reference raises on are counted, the mapping sets those columns to None.
+    """
+    processor = Page_Processor()
+    offers = []
+    for page in pages:
+        offer = call(lambda x: extract_offer(processor, str(x)), page)
+        if isinstance(offer, dict):
+            offers.append(offer)
+            offers.extend([{k: v for k, v in offer.items() if k != name} for name in offer])
+    if not offers:
+        print('\nOffer fields, no detail pages')
+        return True
+
+    reference_time, expected = time_it(lambda x: call(_reference_offer, x), offers, repeat)
+    compiled_time, actual = time_it(lambda x: call(mapping.OFFER, x), offers, repeat)
+    report('Offer fields', {'or-chains': reference_time, 'compiled': compiled_time}, offers, 'or-chains', 'offer')
+    raised = [x for x, y in zip(expected, actual) if isinstance(x, str) and isinstance(y, dict)]
+    if raised:
+        print(f'  {len(raised)} of {len(offers)} offers raise only in the reference: {", ".join(sorted(set(raised)))}')
+    mismatches = [
+        name
+        for x, y in zip(expected, actual)
+        if isinstance(x, dict)
+        for name in x
+        if not isinstance(y, dict) or x[name] != y.get(name)
+    ]
+    for name in sorted(set(mismatches)):
+        print(f'  MISMATCH {name} in {mismatches.count(name)} offers')
+    return not mismatches
+
+
+def _reference_offer(result: dict[str, Any]) -> dict[str, Any]:
+    """
+    The column mapping of Page_Processor.prepare_data_for_insert before
+    config.OFFER_FIELDS, without the status. Kept as the baseline to time the mapping against,
+    tests/test_mapping.py checks the columns on committed fixtures.
+    """
+    offer = {
+        "city": (
+            result.get('city', {}).get('name', None)
+            or result.get('location', {}).get('address', {}).get('city', {}).get('name', None)
+        ),
+        "postal_code": (
+            result.get('location', {}).get('address', {}).get('postalCode', None)
+            or result.get('location', {}).get('address', {}).get('postalCode', {}).get('name', None)
+            or result.get('city', {}).get('id') if len(result.get('city', {}).get('id')) >= 5 else None
+        ),
+        "street": (
+            parser.parse_street(result.get('street', None))
+            or result.get('location', {}).get('address', {}).get('street', {}).get('name', None)
+        ),
+        "price": (
+            result.get('characteristics', {}).get('Cena', {}).get('value', None)
+            or result.get('characteristics', {}).get('price', {}).get('value', None)
+            or result.get('topInformation', {}).get('price', {}).get('values', None)
+        ),
+        "area": (
+            result.get('characteristics', {}).get('Powierzchnia', {}).get('value', None)
+            or result.get('characteristics', {}).get('m', {}).get('value', None)
+            or result.get('topInformation', {}).get('area', {}).get('values', None)
+            or result.get('target', {}).get('Area')
+        ),
+        "price_per_m2": (
+            result.get('characteristics', {}).get('cena za metr', {}).get('value', None)
+            or result.get('characteristics', {}).get('price_per_m', {}).get('value', None)
+            or result.get('target', {}).get('Price_per_m')
+        ),
+        "floors": (
+            parser.parse_floors(result.get('characteristics', {}).get('Liczba pięter', {}).get('value', None))
+            or parser.parse_floors(result.get('characteristics', {}).get('floors_num', {}).get('value', None))
+            or parser.parse_floors(result.get('additionalInformation', {}).get('floors_num', {}).get('values'))
+            or parser.parse_floors(result.get('target', {}).get('floors_num'))
+        ),
+        "floor": (
+            parser.parse_floor(result.get('characteristics', {}).get('Piętro', {}).get('localizedValue', None))
+            or parser.parse_floor(result.get('characteristics', {}).get('floor', {}).get('localizedValue', None))
+            or parser.parse_floor(result.get('additionalInformation', {}).get('floors', {}).get('values'))
+            or parser.parse_floor(result.get('characteristics', {}).get('floor', {}).get('value', None))
+        ),
+        "rooms": (
+            parser.parse_rooms(result.get('characteristics', {}).get('Liczba pokoi', {}).get('value', None))
+            or parser.parse_rooms(result.get('characteristics', {}).get('rooms_num', {}).get('value', None))
+            or parser.parse_rooms(result.get('topInformation', {}).get('rooms_num', {}).get('values', None))
+            or parser.parse_rooms(result.get('target', {}).get('Rooms_num'))
+        ),
+        "build_year": (
+            result.get('characteristics', {}).get('Rok budowy', {}).get('value', None)
+            or result.get('characteristics', {}).get('build_year', {}).get('value', None)
+            or result.get('topInformation', {}).get('build_year', {}).get('values', None)
+            or result.get('target', {}).get('Build_year')
+        ),
+        "building_type": (
+            result.get('characteristics', {}).get('Rodzaj zabudowy', {}).get('value', None)
+            or result.get('characteristics', {}).get('building_type', {}).get('value', None)
+            or result.get('topInformation', {}).get('building_type', {}).get('values', None)
+            or result.get('target', {}).get('Building_type')
+        ),
+        "building_material": (
+            result.get('characteristics', {}).get('Materiał budynku', {}).get('value', None)
+            or result.get('characteristics', {}).get('building_material', {}).get('value', None)
+            or result.get('additionalInformation', {}).get('building_material', {}).get('values', None)
+        ),
+        "rent": (
+            result.get('characteristics', {}).get('Czynsz', {}).get('value', None)
+            or result.get('characteristics', {}).get('rent', {}).get('value', None)
+            or result.get('topInformation', {}).get('rent', {}).get('values', None)
+        ),
+        "windows": (
+            result.get('characteristics', {}).get('Okna', {}).get('value', None)
+            or result.get('characteristics', {}).get('windows_type', {}).get('value', None)
+            or result.get('additionalInformation', {}).get('windows_type', {}).get('values', None)
+        ),
+        "land_area": (
+            result.get('characteristics', {}).get('Powierzchnia działki', {}).get('value', None)
+            or result.get('characteristics', {}).get('terrain_area', {}).get('value', None)
+            or result.get('topInformation', {}).get('terrain_area', {}).get('values', None)
+            or result.get('target', {}).get('Terrain_area')
+        ),
+        "construction_status": (
+            result.get('characteristics', {}).get('Stan wykończenia', {}).get('value', None)
+            or result.get('characteristics', {}).get('construction_status', {}).get('value', None)
+            or result.get('topInformation', {}).get('construction_status', {}).get('values', None)
+            or result.get('target', {}).get('Construction_status', None)
+        ),
+        "market": (
+            result.get('characteristics', {}).get('Rynek', {}).get('value', None)
+            or result.get('characteristics', {}).get('market', {}).get('value', None)
+            or result.get('additionalInformation', {}).get('market', {}).get('values', None)
+            or result.get('target', {}).get('MarketType', None)
+            or result.get('market').lower()
+        ),
+        "posted_by": result.get('posted_by'),
+        "description": result.get('description'),
+        "ground_plan": result.get('characteristics', {}).get('Rzut mieszkania', {}).get('value', None),
+        "coordinates_lat_lon": ','.join([str(x) for x in result.get('coordinates', {}).values()]) or None,
+        "informacje_dodatkowe_json": str((
+            result.get('other', {}).get("Informacje dodatkowe", []))
+            or result.get('featuresByCategory', {}).get('Informacje dodatkowe', [])
+        ).replace("'", '"'),
+        "media_json": str((
+                result.get('other', {}).get('Media', []))
+                or result.get('featuresByCategory', {}).get('Media', [])
+        ).replace("'", '"'),
+        "ogrodzenie_json": str((
+                result.get('other', {}).get("Ogrodzenie", []))
+                or result.get('featuresByCategory', {}).get('Ogrodzenie', [])
+        ).replace("'", '"'),
+        "dojazd_json": str((
+            result.get('other', {}).get("Dojazd", []))
+            or result.get('featuresByCategory', {}).get('Dojazd', [])
+        ).replace("'", '"'),
+        "ogrzewanie_json": str((
+            result.get('other', {}).get("Ogrzewanie", []))
+            or result.get('featuresByCategory', {}).get('Ogrzewanie', [])
+        ).replace("'", '"'),
+        "okolica_json": str((
+            result.get('other', {}).get("Okolica", []))
+            or result.get('featuresByCategory', {}).get('Okolica', [])
+        ).replace("'", '"'),
+        "zabezpieczenia_json": str((
+            result.get('other', {}).get("Zabezpieczenia", []))
+            or result.get('featuresByCategory', {}).get('Zabezpieczenia', [])
+        ).replace("'", '"'),
+        "wyposazenie_json": str((
+            result.get('other', {}).get("Wyposaenie", []))
+            or result.get('featuresByCategory', {}).get('Wyposaenie', [])
+        ).replace("'", '"'),
+        "images": str(result.get('images_urls', [])).replace("'", '"'),
+        "contact": str(result.get('contact')).replace("'", '"'),
+        "owner": str(result.get('owner')).replace("'", '"'),
+    }
+    return offer
+
+
+def call(func: Callable[[str], Any], html: str) -> Any:
+    """
+    Returns the result or the exception type, so failures can be compared too.
+    """
+    try:
+        return func(html)
+    except Exception as exc:
+        return type(exc).__name__
+
+
+BENCHMARKS = {
+    'next_data': benchmark_next_data,
+    'parsers': benchmark_parsers,
+    'hierarchies': benchmark_hierarchies,
+    'offer_fields': benchmark_offer_fields,
+}
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description='Parse benchmarks on saved listing and detail pages.')
+    arg_parser.add_argument('paths', nargs='*', help=f'HTML files or folders, {config.SOURCE_FOLDER} by default')
+    arg_parser.add_argument('--limit', type=int, default=None, help='Use at most this many pages')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Best of this many runs')
+    arg_parser.add_argument('--only', choices=list(BENCHMARKS), action='append', help='Run only these benchmarks')
+    args = arg_parser.parse_args()
+
+    pages = get_pages(args.paths, args.limit)
+    if not pages:
+        print('No pages found')
+        return 1
+    passed = [BENCHMARKS[x](pages, args.repeat) for x in args.only or BENCHMARKS]
+    return 0 if all(passed) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,17 +1,25 @@
+import json
+import mmap
 from datetime import datetime as dt
 from typing import Any, Callable
-from time import sleep
-from random import randint
 from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from bs4 import BeautifulSoup
 import requests
-from rich.progress import track
+from rich.progress import Progress, track
+try:
+    from selectolax.lexbor import LexborHTMLParser, LexborNode
+except ImportError:
+    LexborHTMLParser = LexborNode = None
 
 import config
+from src.database.validators import Validator_Store
 from src.utils.log_util import get_logger
-from src.scraper import parser
-from src.utils.http_util import HTTP_Util
+from src.scraper import hierarchies, mapping, parser, transformation
+from src.utils.file_utils import File_Util
+from src.utils.http_util import Async_Downloader, HTTP_Util, Page_Download
 
 
 log = get_logger(__name__, 30, True, True)
@@ -23,7 +31,8 @@ class Detail_Page_Audit_Item:
     id: int
     url_id: str
     url: str
-    response: requests.Response|None = None
+    status_code: int|None = None
+    headers: dict[str, str]|None = None
     extracted_offer_data: dict[str, str|int|float]|None = None
     filepath: str|None = None
     visited_at: str|None = None
@@ -34,6 +43,8 @@ class Detail_Page_Audit_Item:
     updated_run_id: int|None = None
     expired_run_id: int|None = None
     status: int|None = None
+    not_modified: bool = False
+    validators: dict[str, str|None]|None = None
 
     def set_error(
             self,
@@ -67,21 +78,69 @@ class Detail_Page_Audit_Item:
             log.warning(f'{self.url_id} - {self.id} - Pointless visited_at update with None value')
         self.visited_at = visited_at
 
+class Selectolax_Node:
+    """
+    Wraps a selectolax node in the part of the BeautifulSoup API
+    the hierarchies use: find, find_all, text and attribute access.
+    """
+    def __init__(self, node: 'LexborNode'):
+        self.node = node
+
+    def find(self, tag: str, attrs: dict[str, str|bool]|None = None) -> 'Selectolax_Node|None':
+        node = self.node.css_first(self.__get_selector(tag, attrs))
+        return Selectolax_Node(node) if node is not None else None
+
+    def find_all(self, tag: str, attrs: dict[str, str|bool]|None = None, **kwargs: str|bool) -> list['Selectolax_Node']:
+        selector = self.__get_selector(tag, {**(attrs or {}), **kwargs})
+        return [Selectolax_Node(x) for x in self.node.css(selector)]
+
+    @property
+    def text(self) -> str:
+        return self.node.text(deep=True)
+
+    def get(self, key: str, default: str|None = None) -> str|None:
+        return self.node.attributes.get(key, default)
+
+    def __getitem__(self, key: str) -> str|None:
+        return self.node.attributes[key]
+
+    @staticmethod
+    def __get_selector(tag: str, attrs: dict[str, str|bool]|None) -> str:
+        selector = tag
+        for name, value in (attrs or {}).items():
+            if value is True:
+                selector += f'[{name}]'
+            else:
+                escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+                selector += f'[{name}="{escaped}"]'
+        return selector
+
+
 class Page_Processor:
     OFFER_LINK_PREFIX = config.OFFER_LINK_STARTSWITH
+    NEXT_DATA_MARKER = b'id="__NEXT_DATA__"'
+    PARSER_BACKENDS = ['html.parser', 'lxml', 'selectolax']
 
     def __init__(
             self,
             run_time: str = dt.now().isoformat(),
-            offer_link_startswith: str = config.OFFER_LINK_STARTSWITH):
+            offer_link_startswith: str = config.OFFER_LINK_STARTSWITH,
+            parser_backend: str = config.PARSER['backend']):
+        if parser_backend not in self.PARSER_BACKENDS:
+            raise ValueError(f'Unsupported parser backend: {parser_backend}, expected one of {self.PARSER_BACKENDS}')
+        if parser_backend == 'selectolax' and LexborHTMLParser is None:
+            raise ImportError('The selectolax parser backend needs the selectolax package')
         self.run_time = run_time
         self.offer_link_startswith = offer_link_startswith
+        self.parser_backend = parser_backend
 
-    def make_soup(self, raw_html: str) -> BeautifulSoup:
+    def make_soup(self, raw_html: str) -> BeautifulSoup|Selectolax_Node:
         """
-        Create soup object from raw html
+        Create soup object from raw html with the configured parser backend
         """
-        return BeautifulSoup(raw_html, 'html.parser')
+        if self.parser_backend == 'selectolax':
+            return Selectolax_Node(LexborHTMLParser(raw_html).root)
+        return BeautifulSoup(raw_html, self.parser_backend)
 
     def get_links(self, raw_listing_html: str) -> list[str]:
         """
@@ -98,32 +157,108 @@ class Page_Processor:
             if x.startswith(self.OFFER_LINK_PREFIX)
         ]
 
-    def get_item_from(self, soup: BeautifulSoup|dict, hierarchy: dict[str, list[str|dict[str, list|Callable]]]) -> dict[str, str]|BeautifulSoup:
-        transformations = {
-            'soup': self.__get_item_from_soup,
-            'json': self.__get_item_from_json
-        }
-        output = soup
-        
-        for stage in hierarchy['stages']:
-            output = transformations.get(stage['input'])(output, stage['path'])
-            if stage.get('transformation'):
-                output = self.__transform(output, stage['transformation'])
+    def get_item_from(
+            self,
+            soup: BeautifulSoup|dict,
+            hierarchy: dict[str, list[str|dict[str, list|Callable]]]|hierarchies.Compiled_Hierarchy
+        ) -> dict[str, str]|BeautifulSoup:
+        """
+        Runs the hierarchy on the soup or JSON. Pass one of the compiled
+        hierarchies, a hierarchy dict is compiled on every call.
+        """
+        return self.__compile(hierarchy)(soup)
 
-        return output
+    def get_offer_details(
+            self,
+            filepath: str,
+            hierarchy: dict[str, list[dict[str, Any]]]|hierarchies.Compiled_Hierarchy
+        ) -> dict[str, Any]|None:
+        """
+        Returns the offer JSON of a saved detail page.
+        When the hierarchy starts at the __NEXT_DATA__ script, the script is read
+        straight from the file bytes, otherwise or when the markup is unexpected
+        the page is parsed with soup.
+        """
+        compiled = self.__compile(hierarchy)
+        if compiled.starts_at_next_data:
+            data = self.read_next_data(filepath)
+            if data is not None:
+                return compiled.run_from(data, 1)
+            log.debug(f'__NEXT_DATA__ not found by the byte scan of {filepath}, using soup')
+        soup = self.make_soup(File_Util.read_file(filepath))
+        return compiled(soup)
+
+    @classmethod
+    def read_next_data(cls, filepath: str) -> dict[str, Any]|None:
+        """
+        Finds the <script id="__NEXT_DATA__"> tag in a memory-mapped file
+        and decodes its JSON, without building a DOM.
+        Returns None when the tag or its JSON is not as expected.
+        """
+        with open(filepath, 'rb') as file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                return None
+        with buffer:
+            marker = buffer.find(cls.NEXT_DATA_MARKER)
+            if marker == -1:
+                return None
+            tag_start = buffer.rfind(b'<', 0, marker)
+            if buffer[tag_start:tag_start + 7].lower() != b'<script' or buffer.find(b'>', tag_start, marker) != -1:
+                return None
+            content_start = buffer.find(b'>', marker) + 1
+            content_end = buffer.find(b'</script>', content_start)
+            if not content_start or content_end == -1:
+                return None
+            try:
+                return json.loads(buffer[content_start:content_end])
+            except ValueError:
+                return None
+
+    @staticmethod
+    def __compile(
+            hierarchy: dict[str, list[dict[str, Any]]]|hierarchies.Compiled_Hierarchy
+        ) -> hierarchies.Compiled_Hierarchy:
+        if isinstance(hierarchy, hierarchies.Compiled_Hierarchy):
+            return hierarchy
+        return hierarchies.Compiled_Hierarchy(hierarchy)
 
     def get_pagination(self, raw_html: str) -> dict[str, int]:
         soup = self.make_soup(raw_html=raw_html)
-        return self.get_item_from(soup, config.HIERARCHIES['pagination'])
+        return hierarchies.PAGINATION(soup)
+
+    def get_listing_summaries(self, raw_html: str) -> dict[str, dict[str, int|float|None]]:
+        """
+        Extracts per-offer summaries from the search results JSON
+        embedded in a listing page.
+
+        Returns a dict of url_id: {'price': ..., 'area': ..., 'rooms': ...}
+        """
+        hierarchy = config.HIERARCHIES['listing_items']
+        soup = self.make_soup(raw_html=raw_html)
+        items = hierarchies.LISTING_ITEMS(soup) or []
+        summaries = {}
+        for item in transformation.filter_list_of_dict(items, hierarchy['attributes']):
+            if not item.get('slug'):
+                continue
+            summaries[item['slug'].split('-')[-1]] = {
+                'price': (item.get('totalPrice') or {}).get('value'),
+                'area': item.get('areaInSquareMeters'),
+                'rooms': parser.parse_rooms_number(item.get('roomsNumber'))
+            }
+        return summaries
 
     def prepare_data_for_insert(
             self,
             result: dict[str, dict[str, str|int|None]],
-            response: requests.Response
+            status_code: int|None
         ) -> dict[str, str|int|None]:
         """
         Prepare data for insert into the database.
-        The result input is the output after parsing a single detail page.
+        The result input is the output after parsing a single detail page,
+        mapped to the columns by config.OFFER_FIELDS.
+        Error responses and offers without a status code are set as status 2.
         """
         status_code_to_status_map = {
             range(200, 300): 1,
@@ -131,174 +266,22 @@ class Page_Processor:
             range(400, 500): 2,
             range(500, 600): 1
         }
-        if response:
+        if status_code and status_code < 400:
             status = [
                 v
                 for k, v
                 in status_code_to_status_map.items()
-                if response.status_code in k
+                if status_code in k
             ][0]
         else:
             status = 2
-        offer = {
-            "status": status,
-            "city": (
-                result.get('city', {}).get('name', None)
-                or result.get('location', {}).get('address', {}).get('city', {}).get('name', None)
-            ),
-            "postal_code": (
-                result.get('location', {}).get('address', {}).get('postalCode', None)
-                or result.get('location', {}).get('address', {}).get('postalCode', {}).get('name', None)
-                or result.get('city', {}).get('id') if len(result.get('city', {}).get('id')) >= 5 else None
-            ),
-            "street": (
-                parser.parse_street(result.get('street', None))
-                or result.get('location', {}).get('address', {}).get('street', {}).get('name', None)
-            ),
-            "price": (
-                result.get('characteristics', {}).get('Cena', {}).get('value', None)
-                or result.get('characteristics', {}).get('price', {}).get('value', None)
-                or result.get('topInformation', {}).get('price', {}).get('values', None)
-            ),
-            "area": (
-                result.get('characteristics', {}).get('Powierzchnia', {}).get('value', None)
-                or result.get('characteristics', {}).get('m', {}).get('value', None)
-                or result.get('topInformation', {}).get('area', {}).get('values', None)
-                or result.get('target', {}).get('Area')
-            ),
-            "price_per_m2": (
-                result.get('characteristics', {}).get('cena za metr', {}).get('value', None)
-                or result.get('characteristics', {}).get('price_per_m', {}).get('value', None)
-                or result.get('target', {}).get('Price_per_m')
-            ),
-            "floors": (
-                parser.parse_floors(result.get('characteristics', {}).get('Liczba pięter', {}).get('value', None))
-                or parser.parse_floors(result.get('characteristics', {}).get('floors_num', {}).get('value', None))
-                or parser.parse_floors(result.get('additionalInformation', {}).get('floors_num', {}).get('values'))
-                or parser.parse_floors(result.get('target', {}).get('floors_num'))
-            ),
-            "floor": (
-                parser.parse_floor(result.get('characteristics', {}).get('Piętro', {}).get('localizedValue', None))
-                or parser.parse_floor(result.get('characteristics', {}).get('floor', {}).get('localizedValue', None))
-                or parser.parse_floor(result.get('additionalInformation', {}).get('floors', {}).get('values'))
-                or parser.parse_floor(result.get('characteristics', {}).get('floor', {}).get('value', None))
-            ),
-            "rooms": (
-                parser.parse_rooms(result.get('characteristics', {}).get('Liczba pokoi', {}).get('value', None))
-                or parser.parse_rooms(result.get('characteristics', {}).get('rooms_num', {}).get('value', None))
-                or parser.parse_rooms(result.get('topInformation', {}).get('rooms_num', {}).get('values', None))
-                or parser.parse_rooms(result.get('target', {}).get('Rooms_num'))
-            ),
-            "build_year": (
-                result.get('characteristics', {}).get('Rok budowy', {}).get('value', None)
-                or result.get('characteristics', {}).get('build_year', {}).get('value', None)
-                or result.get('topInformation', {}).get('build_year', {}).get('values', None)
-                or result.get('target', {}).get('Build_year')
-            ),
-            "building_type": (
-                result.get('characteristics', {}).get('Rodzaj zabudowy', {}).get('value', None)
-                or result.get('characteristics', {}).get('building_type', {}).get('value', None)
-                or result.get('topInformation', {}).get('building_type', {}).get('values', None)
-                or result.get('target', {}).get('Building_type')
-            ),
-            "building_material": (
-                result.get('characteristics', {}).get('Materiał budynku', {}).get('value', None)
-                or result.get('characteristics', {}).get('building_material', {}).get('value', None)
-                or result.get('additionalInformation', {}).get('building_material', {}).get('values', None)
-            ),
-            "rent": (
-                result.get('characteristics', {}).get('Czynsz', {}).get('value', None)
-                or result.get('characteristics', {}).get('rent', {}).get('value', None)
-                or result.get('topInformation', {}).get('rent', {}).get('values', None)
-            ),
-            "windows": (
-                result.get('characteristics', {}).get('Okna', {}).get('value', None)
-                or result.get('characteristics', {}).get('windows_type', {}).get('value', None)
-                or result.get('additionalInformation', {}).get('windows_type', {}).get('values', None)
-            ),
-            "land_area": (
-                result.get('characteristics', {}).get('Powierzchnia działki', {}).get('value', None)
-                or result.get('characteristics', {}).get('terrain_area', {}).get('value', None)
-                or result.get('topInformation', {}).get('terrain_area', {}).get('values', None)
-                or result.get('target', {}).get('Terrain_area')
-            ),
-            "construction_status": (
-                result.get('characteristics', {}).get('Stan wykończenia', {}).get('value', None)
-                or result.get('characteristics', {}).get('construction_status', {}).get('value', None)
-                or result.get('topInformation', {}).get('construction_status', {}).get('values', None)
-                or result.get('target', {}).get('Construction_status', None)
-            ),
-            "market": (
-                result.get('characteristics', {}).get('Rynek', {}).get('value', None)
-                or result.get('characteristics', {}).get('market', {}).get('value', None)
-                or result.get('additionalInformation', {}).get('market', {}).get('values', None)
-                or result.get('target', {}).get('MarketType', None)
-                or result.get('market').lower()
-            ),
-            "posted_by": result.get('posted_by'),
-            "description": result.get('description'),
-            "ground_plan": result.get('characteristics', {}).get('Rzut mieszkania', {}).get('value', None),
-            "coordinates_lat_lon": ','.join([str(x) for x in result.get('coordinates', {}).values()]) or None,
-            "informacje_dodatkowe_json": str((
-                result.get('other', {}).get("Informacje dodatkowe", []))
-                or result.get('featuresByCategory', {}).get('Informacje dodatkowe', [])
-            ).replace("'", '"'),
-            "media_json": str((
-                    result.get('other', {}).get('Media', []))
-                    or result.get('featuresByCategory', {}).get('Media', [])
-            ).replace("'", '"'),
-            "ogrodzenie_json": str((
-                    result.get('other', {}).get("Ogrodzenie", []))
-                    or result.get('featuresByCategory', {}).get('Ogrodzenie', [])
-            ).replace("'", '"'),
-            "dojazd_json": str((
-                result.get('other', {}).get("Dojazd", []))
-                or result.get('featuresByCategory', {}).get('Dojazd', [])
-            ).replace("'", '"'),
-            "ogrzewanie_json": str((
-                result.get('other', {}).get("Ogrzewanie", []))
-                or result.get('featuresByCategory', {}).get('Ogrzewanie', [])
-            ).replace("'", '"'),
-            "okolica_json": str((
-                result.get('other', {}).get("Okolica", []))
-                or result.get('featuresByCategory', {}).get('Okolica', [])
-            ).replace("'", '"'),
-            "zabezpieczenia_json": str((
-                result.get('other', {}).get("Zabezpieczenia", []))
-                or result.get('featuresByCategory', {}).get('Zabezpieczenia', [])
-            ).replace("'", '"'),
-            "wyposazenie_json": str((
-                result.get('other', {}).get("Wyposaenie", []))
-                or result.get('featuresByCategory', {}).get('Wyposaenie', [])
-            ).replace("'", '"'),
-            "images": str(result.get('images_urls', [])).replace("'", '"'),
-            "contact": str(result.get('contact')).replace("'", '"'),
-            "owner": str(result.get('owner')).replace("'", '"'),
-        }
-        return offer
-
-    def __transform(self, soup: BeautifulSoup, transformation: Callable) -> Any:
-        return transformation(soup.text)
-
-    def __get_item_from_soup(self, soup: BeautifulSoup, paths: list[dict[str, dict[str, str]]]) -> BeautifulSoup:
-            for path in paths:
-                tag, attributes = list(path.items())[0]
-                soup = soup.find(tag, attributes)
-                if not soup:
-                    raise ValueError(f"Tag {tag} with attributes {attributes} not found in the soup.")
-            return soup
-
-    def __get_item_from_json(self, item: dict, paths: list[dict[str, dict[str, str]]]) -> dict[str, Any]:
-        for path in paths:
-            tag, attributes = list(path.items())[0]
-            item = item.get(tag, None)
-        return item
+        return {'status': status, **mapping.OFFER(result)}
 
     def __get_links_from(self, soup: BeautifulSoup) -> list[str]:
         """
         Extract links from a sub-tag which contains the list of offers
         """
-        item = self.get_item_from(soup, config.HIERARCHIES['offer_links'])
+        item = hierarchies.OFFER_LINKS(soup)
         a_tags = item.find_all('a', href=True)
         return [a['href'] for a in a_tags]
 
@@ -311,7 +294,8 @@ class Link_Extractor:
             self,
             listing: str='houses',
             run_time: dt=dt.now().isoformat(),
-            http_util: HTTP_Util=HTTP_Util()
+            http_util: HTTP_Util=HTTP_Util(),
+            validator_store: Validator_Store=Validator_Store()
         ) -> None:
         self.run_time = run_time
         self.listing = listing
@@ -319,6 +303,9 @@ class Link_Extractor:
         self.pages_listing: list[requests.Response] = []
         self.pagination: dict[str, int] = {}
         self.http_util = http_util
+        self.validator_store = validator_store
+        self.downloader = Async_Downloader(http_util)
+        self.newest_first = False
 
         self.set_listing_type(listing)
 
@@ -328,6 +315,13 @@ class Link_Extractor:
                 raise KeyError(f'Missing key in pagination dict: "{key}"')
         self.pagination = pagination
 
+    def set_newest_first(self, newest_first: bool) -> None:
+        """
+        Sort the listing newest-first, required by an incremental crawl.
+        Has to be set before the first listing page is fetched.
+        """
+        self.newest_first = newest_first
+
     def set_first_listing_page(self):
         log.info('Fetching listing pages')
         url = self.__build_url_for_listing(
@@ -336,31 +330,141 @@ class Link_Extractor:
         )
         self.pages_listing.append(self.__fetch_page(url))
 
-    def set_remaining_listing_pages(self):
-        for page_no in track(self.__pagination_iterator(),
-                             description='Finding offers...',
-                             total=self.pagination['totalPages'] - 1,
-                             show_speed=False):
-            url = self.__build_url_for_listing(
+    def set_remaining_listing_pages(
+            self,
+            parallel: bool = config.DOWNLOAD['parallel_listing']
+        ) -> None:
+        """
+        Fetches listing pages 2..totalPages and appends them
+        to pages_listing in page order.
+
+        In parallel mode the pages are downloaded concurrently,
+        both modes are paced by the rate limiter of the HTTP_Util.
+        """
+        urls = [
+            self.__build_url_for_listing(
                 page=page_no,
                 base_listing_url=self.__get_base_url()
             )
-            self.__sleep_randomly()
+            for page_no
+            in self.__pagination_iterator()
+        ]
+        if parallel:
+            self.pages_listing.extend(
+                self.__download(urls, description='Finding offers...')
+            )
+            return
+        for url in track(urls,
+                         description='Finding offers...',
+                         total=len(urls),
+                         show_speed=False):
             self.pages_listing.append(self.__fetch_page(url))
 
+    def set_next_listing_page(self) -> bool:
+        """
+        Fetches the listing page following the last fetched one.
+
+        Returns False when there are no more pages.
+        """
+        if not self.pagination:
+            raise ValueError(
+                'Trying to fetch the next listing page before pagination was set.'
+            )
+        page_no = len(self.pages_listing) + 1
+        if page_no > self.pagination['totalPages']:
+            return False
+        url = self.__build_url_for_listing(
+            page=page_no,
+            base_listing_url=self.__get_base_url()
+        )
+        self.pages_listing.append(self.__fetch_page(url))
+        return True
+
     def get_detail_pages(
+            self,
+            detail_page_audit_items: list[Detail_Page_Audit_Item],
+            file_util: File_Util,
+            conditional: bool = config.DOWNLOAD['conditional_requests']
+        ) -> list[Detail_Page_Audit_Item]:
+        """
+        Downloads the detail pages concurrently, streaming every body
+        straight to its file through file_util.
+        Sets the status_code, headers, filepath and visited_at of every item.
+        A download failing after all retries sets the error of its item instead
+        and leaves visited_at empty, so the page is downloaded again next run.
+
+        With conditional requests the stored validators are sent along
+        and not_modified is set for pages unchanged since the last
+        successful parse, their files are not kept. The validators of
+        every 200 response are kept on the item, see save_validators.
+        """
+        def fetch(url: str) -> Page_Download:
+            return self.http_util.download_page(
+                url,
+                write=lambda chunks: file_util.write_detail_chunks(url, chunks),
+                validators=self.validator_store.get(url) if conditional else None
+            )
+
+        def on_done(i: int, download: Page_Download) -> None:
+            item = detail_page_audit_items[i]
+            if download.error:
+                item.set_error(step='Download', message=download.error)
+                return
+            item.status_code = download.status_code
+            item.headers = download.headers
+            item.not_modified = download.not_modified
+            item.validators = download.validators
+            item.filepath = download.filepath
+            if item.not_modified and item.filepath:
+                file_util.delete(Path(item.filepath))
+                item.filepath = None
+            item.visited_at = dt.now().isoformat()
+
+        self.__download(
+            [item.url for item in detail_page_audit_items],
+            description='Downloading offers...',
+            on_done=on_done,
+            fetch=fetch
+        )
+        return detail_page_audit_items
+
+    def probe_detail_pages(
             self,
             detail_page_audit_items: list[Detail_Page_Audit_Item]
         ) -> list[Detail_Page_Audit_Item]:
-        for item in track(detail_page_audit_items,
-                          description='Downloading offers...',
-                          total=len(detail_page_audit_items),
-                          show_speed=False):
-            sleep(randint(5, 25) / 100)
-            item.response = self.__fetch_page(item.url)
+        """
+        Checks concurrently whether the detail pages still exist,
+        without downloading them. Sets the status_code and visited_at of every item,
+        both stay None for a failed probe.
+        """
+        def on_done(i: int, status_code: int|None) -> None:
+            if status_code is None:
+                return
+            item = detail_page_audit_items[i]
+            item.status_code = status_code
             item.visited_at = dt.now().isoformat()
+
+        self.__download(
+            [item.url for item in detail_page_audit_items],
+            description='Probing offers...',
+            on_done=on_done,
+            fetch=self.http_util.probe_page
+        )
         return detail_page_audit_items
 
+    def save_validators(self, detail_page_audit_items: list[Detail_Page_Audit_Item]) -> None:
+        """
+        Stores the validators of the items for the next conditional requests.
+        Should be called only for items which were stored successfully,
+        in the transaction storing them, otherwise a failed offer
+        would be skipped as unchanged next time.
+        """
+        self.validator_store.save({
+            item.url: item.validators
+            for item in detail_page_audit_items
+            if item.validators
+        })
+
     def set_detail_urls(self, paths: list[str]) -> None:
         self.detail_urls = list({
             self.__build_url_for_detail(link)
@@ -376,10 +480,26 @@ class Link_Extractor:
             )
         self.listing = listing_for
 
-    def __sleep_randomly(self) -> None:
-        sleep_time = round(300 / randint(100, 180), 4)
-        log.debug(f'Sleep for {sleep_time}s')
-        sleep(sleep_time)
+    def __download(
+            self,
+            urls: list[str],
+            description: str,
+            on_done: Callable[[int, Any], None]|None = None,
+            fetch: Callable[[str], Any]|None = None
+        ) -> list[Any]:
+        """
+        Downloads urls concurrently while showing a progress bar.
+        Returns the results of fetch (responses by default) in the order of urls.
+        """
+        with Progress() as progress:
+            task = progress.add_task(description, total=len(urls))
+
+            def advance(i: int, result: Any) -> None:
+                if on_done:
+                    on_done(i, result)
+                progress.advance(task)
+
+            return self.downloader.fetch_pages(urls, on_done=advance, fetch=fetch)
 
     def __fetch_page(self, url: str) -> requests.Response:
         """
@@ -400,7 +520,20 @@ class Link_Extractor:
         return url
     
     def __get_base_url(self) -> str:
-        return self.START_URLS.get(self.listing, {}).get('url', None)
+        url = self.START_URLS.get(self.listing, {}).get('url', None)
+        if url and self.newest_first:
+            return self.__with_query_params(url, config.INCREMENTAL_CRAWL['newest_first_params'])
+        return url
+
+    @staticmethod
+    def __with_query_params(url: str, params: dict[str, str]) -> str:
+        """
+        Returns the url with params added or replaced in its query string.
+        """
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        query.update(params)
+        return urlunsplit(parts._replace(query=urlencode(query)))
 
     def __pagination_iterator(self):
         if not self.pagination:
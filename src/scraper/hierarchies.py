@@ -0,0 +1,140 @@
+"""
+The hierarchies from config compiled into flat lists of steps.
+
+A step is a callable which takes the output of the previous one: a soup find
+per path element of a soup stage, one step for all keys of a json stage and
+one for a stage transformation. The hierarchies are checked when they are
+compiled, so a broken config fails at import and not on the first page.
+"""
+import json
+from typing import Any, Callable
+
+import config
+
+
+INPUTS = ('soup', 'json')
+
+
+class Compiled_Hierarchy:
+    def __init__(self, hierarchy: dict[str, Any], name: str = 'hierarchy', with_transformation: bool = False):
+        """
+        with_transformation also applies the hierarchy level transformation
+        with the hierarchy attributes, as done for HIERARCHY_DETAILS.
+        """
+        validate(hierarchy, name)
+        self.name = name
+        self.stages: list[list[Callable[[Any], Any]]] = [_compile_stage(x) for x in hierarchy['stages']]
+        if with_transformation and hierarchy.get('transformation'):
+            self.stages[-1].append(_apply(hierarchy['transformation'], hierarchy.get('attributes')))
+        self.steps = [step for stage in self.stages for step in stage]
+        self.starts_at_next_data = _is_next_data_stage(hierarchy['stages'][0])
+
+    def __call__(self, item: Any) -> Any:
+        for step in self.steps:
+            item = step(item)
+        return item
+
+    def run_from(self, item: Any, stage: int) -> Any:
+        """
+        Runs the stages from the given index on, e.g. on JSON already read
+        by a faster path than the first stage.
+        """
+        for steps in self.stages[stage:]:
+            for step in steps:
+                item = step(item)
+        return item
+
+
+def validate(hierarchy: dict[str, Any], name: str = 'hierarchy') -> None:
+    """
+    Raises ValueError when a hierarchy cannot be run.
+    A soup stage has to come before any json stage and any stage transformation,
+    as both of them leave something which is not soup.
+    """
+    if not isinstance(hierarchy, dict) or not isinstance(hierarchy.get('stages'), list) or not hierarchy['stages']:
+        raise ValueError(f'{name}: expected a dict with a non-empty list of stages')
+    if hierarchy.get('transformation') is not None and not callable(hierarchy['transformation']):
+        raise ValueError(f'{name}: transformation is not callable')
+    if hierarchy.get('attributes') is not None and not isinstance(hierarchy['attributes'], list):
+        raise ValueError(f'{name}: attributes is not a list')
+    is_soup = True
+    for index, stage in enumerate(hierarchy['stages']):
+        where = f'{name} stage {index}'
+        if stage.get('input') not in INPUTS:
+            raise ValueError(f'{where}: unsupported input {stage.get("input")}, expected one of {INPUTS}')
+        if stage['input'] == 'soup' and not is_soup:
+            raise ValueError(f'{where}: soup input after a json stage or a transformation')
+        if stage.get('transformation') is not None and not callable(stage['transformation']):
+            raise ValueError(f'{where}: transformation is not callable')
+        if not isinstance(stage.get('path'), list) or not stage['path']:
+            raise ValueError(f'{where}: expected a non-empty path list')
+        for path in stage['path']:
+            if not isinstance(path, dict) or len(path) != 1:
+                raise ValueError(f'{where}: path element {path} is not a single tag: attributes pair')
+            tag, attributes = list(path.items())[0]
+            if not isinstance(tag, str) or not isinstance(attributes, dict):
+                raise ValueError(f'{where}: path element {path} is not a str: dict pair')
+            if stage['input'] == 'json' and attributes:
+                raise ValueError(f'{where}: json path element {path} has attributes')
+        is_soup = stage['input'] == 'soup' and not stage.get('transformation')
+
+
+def _compile_stage(stage: dict[str, Any]) -> list[Callable[[Any], Any]]:
+    paths = [list(path.items())[0] for path in stage['path']]
+    if stage['input'] == 'soup':
+        steps = [_find(tag, attributes) for tag, attributes in paths]
+    else:
+        steps = [_get(tuple(tag for tag, _ in paths))]
+    if stage.get('transformation'):
+        steps.append(_transform(stage['transformation']))
+    return steps
+
+
+def _find(tag: str, attributes: dict[str, str]) -> Callable[[Any], Any]:
+    def step(soup: Any) -> Any:
+        found = soup.find(tag, attributes)
+        if not found:
+            raise ValueError(f"Tag {tag} with attributes {attributes} not found in the soup.")
+        return found
+    return step
+
+
+def _get(keys: tuple[str, ...]) -> Callable[[dict], Any]:
+    def step(item: dict) -> Any:
+        for key in keys:
+            item = item.get(key, None)
+        return item
+    return step
+
+
+def _transform(transformation: Callable[[str], Any]) -> Callable[[Any], Any]:
+    def step(soup: Any) -> Any:
+        return transformation(soup.text)
+    return step
+
+
+def _apply(transformation: Callable[[Any, list[str]|None], Any], attributes: list[str]|None) -> Callable[[Any], Any]:
+    def step(value: Any) -> Any:
+        return transformation(value, attributes)
+    return step
+
+
+def _is_next_data_stage(stage: dict[str, Any]) -> bool:
+    return (
+        stage['input'] == 'soup'
+        and stage.get('transformation') is json.loads
+        and list(stage['path'][-1].items())[0] == ('script', {'id': '__NEXT_DATA__'})
+    )
+
+
+PAGINATION = Compiled_Hierarchy(config.HIERARCHIES['pagination'], 'pagination')
+LISTING_ITEMS = Compiled_Hierarchy(config.HIERARCHIES['listing_items'], 'listing_items')
+OFFER_LINKS = Compiled_Hierarchy(config.HIERARCHIES['offer_links'], 'offer_links')
+OFFER_DETAILS = {
+    version: Compiled_Hierarchy(hierarchy, f'offer_details version {version}')
+    for version, hierarchy in config.HIERARCHIES['offer_details']['version'].items()
+}
+DETAILS = {
+    name: Compiled_Hierarchy(hierarchy, name, with_transformation=True)
+    for name, hierarchy in config.HIERARCHY_DETAILS.items()
+}
@@ -0,0 +1,128 @@
+"""
+The declarative column mappings from config compiled into single-pass extractors.
+
+Every column is compiled into a closure over its prebound getters: one per
+source path, applied in order until a value is truthy. The dicts read by
+more than one path, like characteristics, are looked up once per item and
+the getters start from them. A missing, None or empty parent reads as
+a shared empty dict, so no throwaway dicts are built.
+"""
+from collections import Counter
+from typing import Any, Callable
+
+import config
+
+
+_EMPTY: dict = {}
+
+
+class Compiled_Mapping:
+    def __init__(self, fields: dict[str, dict[str, Any]], name: str = 'mapping'):
+        validate(fields, name)
+        self.name = name
+        paths = [
+            tuple(path)
+            for field in fields.values()
+            for path in field['sources'] + ([field['guard']['path']] if field.get('guard') else [])
+        ]
+        counts = Counter([path[:length] for path in set(paths) for length in range(1, len(path))])
+        positions: dict[tuple[str, ...], int] = {(): 0}
+        self.parents: list[tuple[int, tuple[str, ...]]] = []
+        for parent in sorted([x for x in counts if counts[x] > 1], key=lambda x: (len(x), x)):
+            base = _get_base(positions, parent)
+            self.parents.append((positions[base], parent[len(base):]))
+            positions[parent] = len(self.parents)
+        self.columns = [(column, _compile_field(field, positions)) for column, field in fields.items()]
+
+    def __call__(self, item: dict[str, Any]) -> dict[str, Any]:
+        return self.extract(item)
+
+    def extract(self, item: dict[str, Any]) -> dict[str, Any]:
+        """
+        Returns the columns of an item extracted by HIERARCHY_DETAILS.
+        """
+        nodes = [item]
+        for base, keys in self.parents:
+            nodes.append(_walk(nodes[base], keys))
+        return {column: field(nodes) for column, field in self.columns}
+
+
+def validate(fields: dict[str, dict[str, Any]], name: str = 'mapping') -> None:
+    """
+    Raises ValueError when a mapping cannot be run.
+    """
+    if not isinstance(fields, dict) or not fields:
+        raise ValueError(f'{name}: expected a non-empty dict of columns')
+    for column, field in fields.items():
+        where = f'{name} column {column}'
+        if not isinstance(field, dict) or not isinstance(field.get('sources'), list) or not field['sources']:
+            raise ValueError(f'{where}: expected a dict with a non-empty list of sources')
+        paths = list(field['sources'])
+        if field.get('guard') is not None:
+            if not isinstance(field['guard'], dict) or not isinstance(field['guard'].get('min_length'), int):
+                raise ValueError(f'{where}: guard has to be a dict with a path and an int min_length')
+            paths.append(field['guard'].get('path'))
+        for path in paths:
+            if not isinstance(path, list) or not path or not all([isinstance(x, str) for x in path]):
+                raise ValueError(f'{where}: path {path} is not a non-empty list of keys')
+        for key in ['parser', 'format']:
+            if field.get(key) is not None and not callable(field[key]):
+                raise ValueError(f'{where}: {key} is not callable')
+        unknown = set(field) - {'sources', 'parser', 'default', 'format', 'guard'}
+        if unknown:
+            raise ValueError(f'{where}: unknown keys {sorted(unknown)}')
+
+
+def _compile_field(field: dict[str, Any], positions: dict[tuple[str, ...], int]) -> Callable[[list[Any]], Any]:
+    sources = [_source(positions, path) for path in field['sources']]
+    default = field.get('default')
+    parser = field.get('parser')
+    formatter = field.get('format')
+    guard = _source(positions, field['guard']['path']) if field.get('guard') else None
+    min_length = field['guard']['min_length'] if field.get('guard') else 0
+
+    def extract(nodes: list[Any]) -> Any:
+        if guard is not None:
+            index, keys, last = guard
+            guarded = _walk(nodes[index], keys).get(last)
+            if guarded is None or len(guarded) < min_length:
+                return None
+        value = None
+        for index, keys, last in sources:
+            node = nodes[index]
+            for key in keys:
+                node = node.get(key) or _EMPTY
+            value = node.get(last, default)
+            if parser:
+                value = parser(value)
+            if value:
+                break
+        return formatter(value) if formatter else value
+    return extract
+
+
+def _source(positions: dict[tuple[str, ...], int], path: list[str]) -> tuple[int, tuple[str, ...], str]:
+    """
+    Returns the getter of a path: the node index of its longest shared parent,
+    the keys from there to the last one, and the last key.
+    """
+    base = _get_base(positions, tuple(path[:-1]))
+    return positions[base], tuple(path[len(base):-1]), path[-1]
+
+
+def _walk(node: dict[str, Any], keys: tuple[str, ...]) -> dict[str, Any]:
+    for key in keys:
+        node = node.get(key) or _EMPTY
+    return node
+
+
+def _get_base(positions: dict[tuple[str, ...], int], path: tuple[str, ...]) -> tuple[str, ...]:
+    """
+    Returns the longest prefix of path which is looked up once per item.
+    """
+    while path not in positions:
+        path = path[:-1]
+    return path
+
+
+OFFER = Compiled_Mapping(config.OFFER_FIELDS, 'OFFER_FIELDS')
@@ -1,27 +1,70 @@
+FLOOR_MAPPING = {
+    'ground_floor': 1,
+    'one_floor': 1,
+    'two_floors': 2,
+    'three_floors': 3,
+    'more': 4,
+    '1': 1,
+    '2': 2,
+    '3': 3,
+    '4': 4,
+    '5': 5,
+    '6': 6,
+    '7': 7,
+    '8': 8,
+    '9': 9,
+    '10': 10
+}
 
+FLOORS_MAPPING = {
+    'parter': 0,
+    '1': 1,
+    '2': 2,
+    '3': 3,
+    '4': 4,
+    '5': 5,
+    '6': 6,
+    '7': 7,
+    '8': 8,
+    '9': 9,
+    '10': 10,
+    '> 10': 11
+}
+
+ROOMS_MAPPING = {
+    '1': 1,
+    '2': 2,
+    '3': 3,
+    '4': 4,
+    '5': 5,
+    '6': 6,
+    '7': 7,
+    '8': 8,
+    '9': 9,
+    '10': 10,
+    'more': 99
+}
+
+ROOMS_NUMBER_MAPPING = {
+    'ONE': '1',
+    'TWO': '2',
+    'THREE': '3',
+    'FOUR': '4',
+    'FIVE': '5',
+    'SIX': '6',
+    'SEVEN': '7',
+    'EIGHT': '8',
+    'NINE': '9',
+    'TEN': '10',
+    'MORE': 'more',
+    'SIX_OR_MORE': None  # open-ended, the exact number is only on the detail page
+}
 
 
 def parse_floor(floor: str|int|None) -> int|None:
     if isinstance(floor, int):
         return floor
-    floor_mapping = {
-        'ground_floor': 1,
-        'one_floor': 1,
-        'two_floors': 2,
-        'three_floors': 3,
-        'more': 4,
-        '1': 1,
-        '2': 2,
-        '3': 3,
-        '4': 4,
-        '5': 5,
-        '6': 6,
-        '7': 7,
-        '8': 8,
-        '9': 9,
-        '10': 10
-    }
-    return floor_mapping.get(floor, None)
+    return FLOOR_MAPPING.get(floor, None)
 
 
 def parse_street(street: dict[str, str|None]) -> str|None:
@@ -41,21 +84,7 @@ def parse_floors(floor: str|None) -> int|None:
     """
     if isinstance(floor, int) or floor is None:
         return floor
-    floor_mapping = {
-        'parter': 0,
-        '1': 1,
-        '2': 2,
-        '3': 3,
-        '4': 4,
-        '5': 5,
-        '6': 6,
-        '7': 7,
-        '8': 8,
-        '9': 9,
-        '10': 10,
-        '> 10': 11
-    }
-    return floor_mapping.get(floor, None)
+    return FLOORS_MAPPING.get(floor, None)
 
 
 def parse_rooms(rooms: str|None) -> int|None:
@@ -64,17 +93,13 @@ def parse_rooms(rooms: str|None) -> int|None:
     """
     if isinstance(rooms, int) or rooms is None:
         return rooms
-    rooms_mapping = {
-        '1': 1,
-        '2': 2,
-        '3': 3,
-        '4': 4,
-        '5': 5,
-        '6': 6,
-        '7': 7,
-        '8': 8,
-        '9': 9,
-        '10': 10,
-        'more': 99
-    }
-    return rooms_mapping.get(rooms, None)
+    return ROOMS_MAPPING.get(rooms, None)
+
+
+def parse_rooms_number(rooms_number: str|None) -> int|None:
+    """
+    Parse the roomsNumber enum (e.g. "THREE") from the listing JSON data.
+    Returns the same values as parse_rooms does for the detail page,
+    None for open-ended or unknown values.
+    """
+    return parse_rooms(ROOMS_NUMBER_MAPPING.get(rooms_number, None))
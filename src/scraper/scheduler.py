@@ -0,0 +1,117 @@
+from datetime import datetime as dt, timedelta
+
+import config
+from src.database import db, queries
+from src.utils.log_util import get_logger
+
+
+log = get_logger(__name__, 30, True, True)
+log.setLevel(config.LOGGING['levels']['console'])
+
+
+class Revisit_Scheduler:
+    """
+    Gives every known offer a next check time and picks the offers
+    whose detail page is downloaded in a run.
+
+    The revisit interval starts at min_hours and doubles every doubling_days
+    without a price or content change. It is divided by the number of changes
+    per week seen so far and shortened by absent_from_listing_factor for offers
+    missing from the listing. New offers are always checked after min_hours.
+    """
+    def __init__(
+            self,
+            entity: str,
+            run_time: str = dt.now().isoformat(),
+            budget_per_run: int = config.REVISIT['budget_per_run'],
+            min_hours: float = config.REVISIT['min_hours'],
+            max_hours: float = config.REVISIT['max_hours'],
+            doubling_days: float = config.REVISIT['doubling_days'],
+            new_offer_days: float = config.REVISIT['new_offer_days'],
+            absent_from_listing_factor: float = config.REVISIT['absent_from_listing_factor']
+        ):
+        if not 0 < min_hours <= max_hours:
+            raise ValueError(f'Expected 0 < min_hours <= max_hours, got {min_hours}, {max_hours}')
+        self.entity = entity
+        self.run_time = dt.fromisoformat(run_time)
+        self.budget_per_run = budget_per_run
+        self.min_hours = min_hours
+        self.max_hours = max_hours
+        self.doubling_days = doubling_days
+        self.new_offer_days = new_offer_days
+        self.absent_from_listing_factor = absent_from_listing_factor
+
+    def select_due(self, url_ids: list[str], already_selected: int = 0) -> list[str]:
+        """
+        Returns the url_ids which are due for a check, never checked ones first,
+        then the most overdue ones. Only the schedule of this entity is read. The result is cut to what is left of
+        the budget after already_selected downloads.
+        """
+        next_checks = {
+            row['url_id']: self.__to_datetime(row['next_check_at'])
+            for row in db.execute_with_return(queries.Revisit_Schedule.get_by_entity, (self.entity,))
+        }
+        due = [
+            url_id
+            for url_id in url_ids
+            if url_id not in next_checks or next_checks[url_id] <= self.run_time
+        ]
+        due.sort(key=lambda url_id: (url_id in next_checks, next_checks.get(url_id, self.run_time)))
+        budget = max(0, self.budget_per_run - already_selected)
+        if len(due) > budget:
+            log.info(f'{len(due) - budget} due offers postponed, budget of {self.budget_per_run} reached')
+        return due[:budget]
+
+    def reschedule(self, url_ids_in_listing: dict[str, bool]) -> None:
+        """
+        Sets the next check time of the checked offers in one batch.
+        url_ids_in_listing maps each checked url_id to whether it is on the listing.
+        """
+        history = {
+            row['url_id']: row
+            for row in db.execute_with_return(
+                queries.Revisit_Schedule.get_change_history, (self.entity,)
+            )
+        }
+        with db.Write_Batch() as batch:
+            for url_id, in_listing in url_ids_in_listing.items():
+                interval_hours = self.get_interval_hours(history.get(url_id), in_listing)
+                batch.add(
+                    queries.Revisit_Schedule.upsert,
+                    (
+                        url_id,
+                        (self.run_time + timedelta(hours=interval_hours)).isoformat(),
+                        round(interval_hours, 2)
+                    )
+                )
+        log.debug(f'Rescheduled {len(url_ids_in_listing)} offers')
+
+    def get_interval_hours(self, history: dict[str, str|int|None]|None, in_listing: bool) -> float:
+        """
+        history is a row of Revisit_Schedule.get_change_history,
+        None for an offer that was never parsed.
+        """
+        if not history or not history.get('first_seen_at'):
+            return self.min_hours
+        first_seen_at = self.__to_datetime(history['first_seen_at'])
+        age_days = max(0.0, (self.run_time - first_seen_at).total_seconds() / 86400)
+        if age_days < self.new_offer_days:
+            return self.min_hours
+
+        last_changed_at = self.__to_datetime(history.get('last_changed_at') or history['first_seen_at'])
+        stable_days = max(0.0, (self.run_time - last_changed_at).total_seconds() / 86400)
+        changes_per_week = (history.get('changes') or 0) / max(age_days / 7, 1)
+
+        interval = self.min_hours * 2 ** (stable_days / self.doubling_days) / (1 + changes_per_week)
+        if not in_listing:
+            interval *= self.absent_from_listing_factor
+        return min(self.max_hours, max(self.min_hours, interval))
+
+    @staticmethod
+    def __to_datetime(value: str|dt) -> dt:
+        """
+        SQLite returns timestamps as text, Postgres as datetime.
+        """
+        if isinstance(value, dt):
+            return value.replace(tzinfo=None)
+        return dt.fromisoformat(str(value)).replace(tzinfo=None)
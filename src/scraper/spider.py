@@ -1,16 +1,20 @@
-from datetime import datetime as dt
-from time import sleep
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt, timedelta
+from typing import Any, Iterator
 
 from rich.progress import track
 
 import config
 from src.database import db, queries
 from src.exceptions import ParsingError
+from src.scraper import hierarchies
 from src.scraper.extraction import (
     Detail_Page_Audit_Item,
     Link_Extractor,
     Page_Processor,
 )
+from src.scraper.scheduler import Revisit_Scheduler
 from src.utils.file_utils import File_Util
 from src.utils.gcp_utils import Reverse_Geocoding
 from src.utils.log_util import get_logger
@@ -18,6 +22,58 @@ from src.utils.log_util import get_logger
 log = get_logger(__name__, 30, True, True)
 log.setLevel(config.LOGGING['levels']['console'])
 
+_worker_processor: Page_Processor | None = None
+
+
+def extract_offer(
+    processor: Page_Processor, filepath: str
+) -> dict[str, dict[str, str | int | None]]:
+    """
+    Extracts the offer fields of a saved detail page.
+    """
+    offer = {}
+
+    if not File_Util.does_file_exist(filepath):
+        raise FileNotFoundError(f'File not found: {filepath}')
+
+    details = processor.get_offer_details(
+        filepath, hierarchies.OFFER_DETAILS[0]
+    )  # TODO: [0] is a version, implement
+    if not details:
+        raise ParsingError(f'Could not parse out offer details')
+
+    for name, accessor in hierarchies.DETAILS.items():
+        offer[name] = accessor(details)
+    return offer
+
+
+def parse_offer_file(
+    processor: Page_Processor, filepath: str, status_code: int | None
+) -> tuple[str, dict[str, str | int | None] | str]:
+    """
+    Returns ('ok', offer data ready for insert), ('parsing_error', message)
+    or ('not_found', message). Other exceptions propagate.
+    Module level so it can run in a process pool.
+    """
+    try:
+        offer_data = extract_offer(processor, filepath)
+    except ParsingError as exc:
+        return 'parsing_error', str(exc)
+    except FileNotFoundError as exc:
+        return 'not_found', str(exc)
+    return 'ok', processor.prepare_data_for_insert(offer_data, status_code)
+
+
+def _set_worker_processor(processor: Page_Processor) -> None:
+    global _worker_processor
+    _worker_processor = processor
+
+
+def _parse_offer_file_in_worker(
+    filepath: str, status_code: int | None
+) -> tuple[str, dict[str, str | int | None] | str]:
+    return parse_offer_file(_worker_processor, filepath, status_code)
+
 
 class Scraper_Service:
     db = db
@@ -29,6 +85,7 @@ class Scraper_Service:
         extractor: Link_Extractor = Link_Extractor,
         processor: Page_Processor = Page_Processor,
         file_util: File_Util = File_Util,
+        scheduler: Revisit_Scheduler = Revisit_Scheduler,
     ):
         self.run_id = None
         self.run_time = run_time
@@ -36,9 +93,16 @@ class Scraper_Service:
         self.extractor: Link_Extractor = extractor(listing_for, run_time)
         self.processor: Page_Processor = processor(run_time)
         self.file_util: File_Util = file_util(run_time)
+        self.scheduler: Revisit_Scheduler = scheduler(listing_for, run_time)
 
         self.filepaths: dict[str, str] = {}
         self.new_url_ids: list[str] = []
+        self.incremental: bool = False
+        self.listing_summaries: dict[str, dict[str, int | float | None]] = {}
+        self.urls_to_refresh: list[str] = []
+        self.unchanged_url_ids: list[str] = []
+        self.url_ids_not_in_listing: set[str] = set()
+        self.visited_url_ids: list[str] = []
 
     def run(self):
         """
@@ -47,6 +111,7 @@ class Scraper_Service:
         try:
             self.__create_db_if_not_exists()
             self.__create_run_id()
+            self.__set_crawl_mode()
             self.__set_pagination()
             self.__set_urls_to_visit()
             self.__upsert_urls_in_database()
@@ -55,7 +120,9 @@ class Scraper_Service:
             self.__update_urls_and_logs_in_database(detail_page_audit_items)
             detail_page_audit_items = self.parse_detail_pages(detail_page_audit_items)
             self.__insert_parsed_offer_to_db(detail_page_audit_items)
+            self.__reschedule_revisits()
             self.__set_google_maps_addresses()
+            self.__save_full_crawl()
             self.__close_run_log(True)
         except Exception as ex:
             log.error('Spider failed')
@@ -75,6 +142,32 @@ class Scraper_Service:
             (dt.now().isoformat(), is_success, self.run_id),
         )
 
+    def __set_crawl_mode(self) -> None:
+        """
+        Decide between an incremental and a full listing crawl.
+        A full crawl runs when incremental crawls are disabled or when the last
+        full crawl of the listing is older than full_crawl_every_hours.
+        """
+        self.incremental = False
+        if config.INCREMENTAL_CRAWL['enabled']:
+            rows = db.execute_with_return(
+                queries.Crawl_State.get_last_full_crawl, (self.listing_for,)
+            )
+            if rows:
+                last_full_crawl_at = dt.fromisoformat(str(rows[0]['last_full_crawl_at']))
+                self.incremental = dt.fromisoformat(self.run_time) - last_full_crawl_at < timedelta(
+                    hours=config.INCREMENTAL_CRAWL['full_crawl_every_hours']
+                )
+        self.extractor.set_newest_first(self.incremental)
+        log.info(f'{"Incremental" if self.incremental else "Full"} listing crawl')
+
+    def __save_full_crawl(self) -> None:
+        if self.incremental:
+            return
+        db.execute_no_return(
+            queries.Crawl_State.set_last_full_crawl, (self.listing_for, self.run_time)
+        )
+
     def __set_urls_to_visit(self) -> None:
         self.__set_urls_to_offers_from_listing()
         self.__add_potentially_expired_urls()
@@ -97,28 +190,51 @@ class Scraper_Service:
         """
         Set offer URLs from the listing pages.
         """
-        self.extractor.set_remaining_listing_pages()
-        paths = []
-        for page in self.extractor.pages_listing:
-            paths.extend(self.processor.get_links(page.text))
+        if self.incremental:
+            paths = self.__crawl_listing_incrementally()
+        else:
+            self.extractor.set_remaining_listing_pages()
+            paths = []
+            for page in self.extractor.pages_listing:
+                paths.extend(self.processor.get_links(page.text))
         self.extractor.set_detail_urls(paths)
+        if config.LISTING_REFRESH['listing_only']:
+            self.__set_listing_summaries()
 
-    def __create_audit_logs_for_details(self) -> None:
-        for url in self.extractor.detail_urls:
-            url_id = self.file_util.get_id4(url)
-            path = self.file_util.get_detail_filename(url)
-            db.execute_no_return(
-                queries.Audit_Logs.create_log,
-                (self.run_id, url_id, path, self.run_time),
-            )
-        log.debug(f'CREATED {len(self.extractor.detail_urls)}')
+    def __set_listing_summaries(self) -> None:
+        """
+        Set per-offer summaries (price, area, rooms) from the listing JSON.
+        Offers without a summary are always refreshed from their detail page.
+        """
+        for page in self.extractor.pages_listing:
+            try:
+                self.listing_summaries.update(
+                    self.processor.get_listing_summaries(page.text)
+                )
+            except (ValueError, KeyError, TypeError) as exc:
+                log.warning(f'Could not read offer summaries from a listing page: {exc}')
 
-    def __add_potentially_expired_urls(self) -> None:
+    def __crawl_listing_incrementally(self) -> list[str]:
         """
-        Creates audit logs for offers (details), that are not on the current listing
-        and are still active in the urls table - potentially expired.
+        Walks the newest-first listing page by page and stops after the first
+        page that holds only offers which are already active in the urls table.
         """
-        db_url_ids = set(
+        known_url_ids = self.__get_active_url_ids()
+        paths = []
+        for page in self.extractor.pages_listing:
+            links = self.processor.get_links(page.text)
+            paths.extend(links)
+            if all(self.file_util.get_id4(link) in known_url_ids for link in links):
+                break
+            if not self.extractor.set_next_listing_page():
+                break
+        log.info(
+            f'Crawled {len(self.extractor.pages_listing)} of {self.extractor.pagination["totalPages"]} listing pages'
+        )
+        return paths
+
+    def __get_active_url_ids(self) -> set[str]:
+        return set(
             [
                 self.file_util.get_id4(x['url'])
                 for x in self.db.execute_with_return(
@@ -126,65 +242,200 @@ class Scraper_Service:
                 )
             ]
         )
+
+    def __create_audit_logs_for_details(self) -> None:
+        self.urls_to_refresh = self.__get_urls_to_refresh()
+        urls = list(self.urls_to_refresh)
+        if config.REVISIT['enabled']:
+            scheduled = self.scheduler.select_due(
+                self.unchanged_url_ids + sorted(self.url_ids_not_in_listing),
+                already_selected=len(urls),
+            )
+            log.info(f'{len(scheduled)} known offers due for a revisit')
+            urls.extend(scheduled)
+        self.__insert_audit_logs(urls)
+        log.debug(f'CREATED {len(urls)}')
+
+    def __insert_audit_logs(self, urls: list[str]) -> int:
+        """
+        Creates the audit logs of a run in a single bulk insert.
+        """
+        return db.insert_many(
+            queries.Audit_Logs.TABLE_NAME,
+            queries.Audit_Logs.CREATE_LOG_COLUMNS,
+            [
+                (
+                    self.run_id,
+                    self.file_util.get_id4(url),
+                    self.file_util.get_detail_filename(url),
+                    self.run_time,
+                )
+                for url in urls
+            ],
+        )
+
+    def __get_urls_to_refresh(self) -> list[str]:
+        """
+        Returns the listing URLs whose detail page should be downloaded.
+
+        In listing-only mode these are only the new or revived offers and
+        the ones whose listing summary differs from their latest stored version.
+        The unchanged offers are marked as updated in this run without a download
+        and kept in unchanged_url_ids for the revisit scheduler.
+        """
+        self.unchanged_url_ids = []
+        if not config.LISTING_REFRESH['listing_only']:
+            return self.extractor.detail_urls
+
+        latest = {
+            row['url_id']: row
+            for row in db.execute_with_return(
+                queries.Offers.get_latest_summaries, (self.listing_for,)
+            )
+        }
+        new_url_ids = set(self.new_url_ids)
+        urls, unchanged = [], []
+        for url in self.extractor.detail_urls:
+            url_id = self.file_util.get_id4(url)
+            if url_id in new_url_ids or self.__has_summary_changed(
+                latest.get(url_id), self.listing_summaries.get(url_id)
+            ):
+                urls.append(url)
+            else:
+                unchanged.append(url_id)
+        with db.Write_Batch() as batch:
+            for url_id in unchanged:
+                batch.add(queries.Urls.update_status, (1, self.run_id, None, url_id))
+        log.info(f'{len(unchanged)} offers unchanged on the listing, skipped')
+        self.unchanged_url_ids = unchanged
+        return urls
+
+    @staticmethod
+    def __has_summary_changed(
+        stored: dict[str, int | float | None] | None,
+        summary: dict[str, int | float | None] | None,
+    ) -> bool:
+        """
+        Compare the listing summary of an offer with its latest stored version.
+        A missing side counts as a change. A field the listing has no value for,
+        like an open-ended or unknown rooms number, is not compared.
+        """
+        if not stored or not summary:
+            return True
+        for field in config.LISTING_REFRESH['compared_fields']:
+            old, new = stored.get(field), summary.get(field)
+            if new is None:
+                continue
+            if old is None:
+                return True
+            try:
+                if round(float(old), 2) != round(float(new), 2):
+                    return True
+            except (TypeError, ValueError):
+                return True
+        return False
+
+    def __add_potentially_expired_urls(self) -> None:
+        """
+        Creates audit logs for offers (details), that are not on the current listing
+        and are still active in the urls table - potentially expired.
+        After an incremental crawl these are mostly offers from the pages
+        that were not crawled.
+
+        With the revisit scheduler enabled the audit logs are created later,
+        only for the offers that are due.
+        """
+        db_url_ids = self.__get_active_url_ids()
         current_url_ids = set(
             [self.file_util.get_id4(x) for x in self.extractor.detail_urls]
         )
         url_ids_not_in_listing = db_url_ids.difference(current_url_ids)
-        count = 0
-        for url in url_ids_not_in_listing:
-            url_id = self.file_util.get_id4(url)
-            path = self.file_util.get_detail_filename(url)
-            db.execute_no_return(
-                queries.Audit_Logs.create_log,
-                (self.run_id, url_id, path, self.run_time),
-            )
-            log.debug(f'Not in listing {url}')
-            count += 1
-        log.info(f'{count} URLs potentially expired added')
+        self.url_ids_not_in_listing = url_ids_not_in_listing
+        if config.REVISIT['enabled']:
+            log.info(f'{len(url_ids_not_in_listing)} known URLs not on the listing')
+            return
+        count = self.__insert_audit_logs(sorted(url_ids_not_in_listing))
+        if self.incremental:
+            log.info(f'{count} known URLs not on the crawled listing pages added')
+        else:
+            log.info(f'{count} URLs potentially expired added')
 
     def __upsert_urls_in_database(self) -> None:
         """
         Upsert URLs in the database.
         """
-        for url in self.extractor.detail_urls:
-            id4 = self.file_util.get_id4(url)
-            if has_inserted := self.db.execute_with_return(
-                db.queries.Urls.create_if_not_exists,
-                (id4, id4, url, 1, self.run_id, self.run_id, id4),
-            ):
-                # TODO: This is trash, rework later
-                # 0 - means new offer inserted
-                # 1 - means offer was already expired but got revived. For more info see the db query.
-
-                flag = has_inserted[0].get('exists_flag')
-                if flag == 0:
-                    log.info(f'NEW {id4}')
-                elif flag == 1:
-                    log.info(f'REVIVED {id4}')
-
-                self.new_url_ids.append(id4)
+        synced = db.sync_urls(
+            [(self.file_util.get_id4(url), url) for url in self.extractor.detail_urls],
+            self.run_id,
+        )
+        for id4 in synced['new']:
+            log.info(f'NEW {id4}')
+        for id4 in synced['revived']:
+            log.info(f'REVIVED {id4}')
+        self.new_url_ids.extend(synced['new'] + synced['revived'])
+        log.info(
+            f"URLs: {len(synced['new'])} new, {len(synced['revived'])} revived, "
+            f"{len(synced['active'])} already active"
+        )
 
     def __download_offer_pages(self) -> list[Detail_Page_Audit_Item]:
         """
         Download offer pages.
         """
         detail_page_audit_items = self.make_detail_page_audit_item_objects('download')
+        expired = self.__probe_offers_missing_from_listing(detail_page_audit_items)
+        expired_ids = set([x.id for x in expired])
         detail_page_audit_items = self.extractor.get_detail_pages(
-            detail_page_audit_items
-        )
-        for item in detail_page_audit_items:
-            item.filepath = self.file_util.write_detail_file(
-                url=item.url, page=item.response.text
-            )
-        log.info(f'{len(detail_page_audit_items)} URLs visited')
+            [x for x in detail_page_audit_items if x.id not in expired_ids], self.file_util
+        ) + expired
+        self.visited_url_ids = [
+            x.url_id
+            for x in detail_page_audit_items
+            if x.visited_at and x.status_code not in range(400, 500)
+        ]
+        failed = len([x.id for x in detail_page_audit_items if not x.visited_at])
+        log.info(f'{len(detail_page_audit_items) - failed} URLs visited')
+        if failed:
+            log.warning(f'{failed} downloads failed, retried next run')
+        log.info(f'{len([x.id for x in detail_page_audit_items if x.not_modified])} not modified')
         # TODO: bleh
         log.info(
-            f'{len([x.id for x in detail_page_audit_items if not x.response.status_code == 200])} expired'
+            f'{len([x.id for x in detail_page_audit_items if x.visited_at and x.status_code not in (200, 304)])} expired'
         )
         if diff := self.__get_number_of_past_failed_tasks(detail_page_audit_items):
             log.warning(f'{diff} failed tasks picked up')
         return detail_page_audit_items
 
+    def __probe_offers_missing_from_listing(
+        self, detail_page_audit_items: list[Detail_Page_Audit_Item]
+    ) -> list[Detail_Page_Audit_Item]:
+        """
+        Most offers missing from the listing have expired. Check them with
+        a probe instead of a full download first.
+
+        Returns the items which answered with 4xx, their status_code
+        and visited_at are set. The remaining items, failed probes included,
+        are left untouched and downloaded as usual.
+        Skipped after an incremental crawl, where missing from the crawled
+        pages mostly means still listed further down.
+        """
+        if not config.DOWNLOAD['probe_missing_offers'] or self.incremental:
+            return []
+        missing = [
+            x for x in detail_page_audit_items if x.url_id in self.url_ids_not_in_listing
+        ]
+        if not missing:
+            return []
+        expired = []
+        for item in self.extractor.probe_detail_pages(missing):
+            if item.status_code in range(400, 500):
+                expired.append(item)
+            else:
+                item.status_code = None
+                item.visited_at = None
+        log.info(f'{len(expired)} of {len(missing)} offers missing from the listing expired')
+        return expired
+
     def make_detail_page_audit_item_objects(
         self, stage: str
     ) -> list[Detail_Page_Audit_Item]:
@@ -212,43 +463,71 @@ class Scraper_Service:
         - expired_at # run_time timestamp
         - status # set to 2
 
+        All updates are written in one transaction.
         """
-        for item in detail_page_audit_items:
-            item.updated_run_id = self.run_id
-            item.status = 1
-
-            if item.response.status_code in range(
-                400, 500
-            ):  # SET status 2 when inserting new offer row
-                log.info(
-                    f'{item.url_id} {item.response.status_code} {item.url} EXPIRED'
-                )
-                item.status = 2
-                item.expired_run_id = self.run_id
-                item.set_error(step='Download', message='EXPIRED')
-            elif item.response.status_code in range(500, 600):
-                log.error(
-                    f'{item.url_id} {item.response.status_code} {item.url} SERVER ERROR'
+        with db.Write_Batch() as batch:
+            for item in detail_page_audit_items:
+                self.__set_download_status(item)
+                batch.add(
+                    queries.Urls.update_status,
+                    (item.status, item.updated_run_id, item.expired_run_id, item.url_id),
                 )
-                item.set_error(
-                    step='Download', message='SERVER ERROR'
-                )  # TODO: Enum? Dataclass?
-            else:
-                log.debug(f'{item.url_id} {item.response.status_code} {item.url} OK')
+                batch.add(*self.__get_audit_log_update(item, step='Download'))
 
-            self.db.execute_no_return(
-                queries.Urls.update_status,
-                (item.status, item.updated_run_id, item.expired_run_id, item.url_id),
+    def __set_download_status(self, item: Detail_Page_Audit_Item) -> None:
+        """
+        Sets the urls status of an item and its error, if any, from the download response.
+        """
+        item.updated_run_id = self.run_id
+        item.status = 1
+
+        if item.status_code in range(
+            400, 500
+        ):  # SET status 2 when inserting new offer row
+            log.info(
+                f'{item.url_id} {item.status_code} {item.url} EXPIRED'
+            )
+            item.status = 2
+            item.expired_run_id = self.run_id
+            item.set_error(step='Download', message='EXPIRED')
+        elif item.status_code in range(500, 600):
+            log.error(
+                f'{item.url_id} {item.status_code} {item.url} SERVER ERROR'
             )
+            item.set_error(
+                step='Download', message='SERVER ERROR'
+            )  # TODO: Enum? Dataclass?
+        elif item.status_code is None:
+            log.warning(
+                f'{item.url_id} {item.url} DOWNLOAD FAILED {item.error_message}'
+            )
+        else:
+            log.debug(f'{item.url_id} {item.status_code} {item.url} OK')
 
-            self.update_audit_log(item, step='Download')
+    def __reschedule_revisits(self) -> None:
+        """
+        Set the next check time of the offers visited in this run.
+        After an incremental crawl an offer missing from the crawled pages
+        is not known to be missing from the listing.
+        """
+        if not config.REVISIT['enabled']:
+            return
+        listing_url_ids = set(
+            [self.file_util.get_id4(x) for x in self.extractor.detail_urls]
+        )
+        self.scheduler.reschedule(
+            {
+                url_id: self.incremental or url_id in listing_url_ids
+                for url_id in self.visited_url_ids
+            }
+        )
 
     def __create_db_if_not_exists(self) -> None:
         """
         Create the database if it does not exist.
         """
         if config.OTODOM_DATABASE_TYPE.lower() == 'sqlite':
-            self.file_util.create_file(config.DB_NAME)
+            self.file_util.create_file(config.OTODOM_DATABASE_NAME)
         self.db.create_tables()
 
     def update_audit_logs(
@@ -256,31 +535,42 @@ class Scraper_Service:
     ) -> None:
         """
         Update the audit logs for the detail pages.
-        Performs a database update statement.
+        Performs the update statements in one transaction.
         """
-        for item in detail_page_audit_items:
-            self.update_audit_log(item, step)
+        with db.Write_Batch() as batch:
+            for item in detail_page_audit_items:
+                batch.add(*self.__get_audit_log_update(item, step))
 
     def update_audit_log(self, item: Detail_Page_Audit_Item, step: str) -> None:
         """
         Update an audit log for a detail page item.
         """
+        db.execute_no_return(*self.__get_audit_log_update(item, step))
+
+    @staticmethod
+    def __get_audit_log_update(
+        item: Detail_Page_Audit_Item, step: str
+    ) -> tuple[str, tuple]:
+        """
+        Returns the audit log update statement of a step and its data.
+        """
         if step == 'Parse':
-            db.execute_no_return(
+            return (
                 queries.Audit_Logs.update_parsed,
                 (item.parsed_at, item.error_step, item.error_message, item.id),
             )
         elif step == 'Download':
-            db.execute_no_return(
+            return (
                 queries.Audit_Logs.update_visited,
                 (
                     item.visited_at,
-                    item.response.status_code,
+                    item.status_code,
                     item.error_step,
                     item.error_message,
                     item.id,
                 ),
             )
+        raise ValueError(f'Unknown audit log step: {step}')
 
     def pick_up_tasks_manually(self) -> list[Detail_Page_Audit_Item]:
         """
@@ -303,37 +593,45 @@ class Scraper_Service:
             )
 
         active_detail_page_audit_items = []
-        not_found = parsing_error = 0
-        for item in track(
-            detail_page_audit_items,
-            description='Parsing offers...',
-            total=len(detail_page_audit_items),
-            show_speed=False,
-        ):
+        not_found = parsing_error = not_modified = 0
+        batch = db.Write_Batch()
+        items_to_parse = []
+        for item in detail_page_audit_items:
+            if not item.visited_at:  # download failed, retried next run
+                continue
             item.set_parsed_at()
             if not self.__is_offer_active(item):
                 continue
+            if item.not_modified:
+                batch.add(*self.__get_audit_log_update(item, step='Parse'))
+                not_modified += 1
+                continue
+            items_to_parse.append(item)
 
-            try:
-                offer_data = self.parse_detail_page(item.filepath)
-            except ParsingError as exc:
+        outcomes = track(
+            self.__parse_offer_files(items_to_parse),
+            description='Parsing offers...',
+            total=len(items_to_parse),
+            show_speed=False,
+        )
+        for (outcome, result), item in zip(outcomes, items_to_parse):
+            if outcome == 'parsing_error':
                 log.warning(f'Failed to parse {item.url_id}')
-                item.set_error(step='Parse', message=str(exc))
-                self.update_audit_log(item, step='Parse')
+                item.set_error(step='Parse', message=result)
+                batch.add(*self.__get_audit_log_update(item, step='Parse'))
                 parsing_error += 1
-                continue
-            except FileNotFoundError as exc:
+            elif outcome == 'not_found':
                 log.debug(f'File not found {item.filepath}')
-                item.set_error(step='Parse', message=str(exc))
-                self.update_audit_log(item, step='Parse')
+                item.set_error(step='Parse', message=result)
+                batch.add(*self.__get_audit_log_update(item, step='Parse'))
                 not_found += 1
-                continue
-
-            item.extracted_offer_data = self.processor.prepare_data_for_insert(
-                offer_data, item.response
-            )
-            active_detail_page_audit_items.append(item)
+            else:
+                item.extracted_offer_data = result
+                active_detail_page_audit_items.append(item)
+        batch.flush()
 
+        if not_modified:
+            log.info(f'{not_modified} offers not modified, skipped')
         if not_found:
             log.warning(f'{not_found} files not found')
         if parsing_error:
@@ -343,34 +641,61 @@ class Scraper_Service:
     def parse_detail_page(
         self, filepath: str
     ) -> dict[str, dict[str, str | int | None]]:
-        offer = {}
-
-        if not self.__does_offer_html_exist(filepath):
-            raise FileNotFoundError(f'File not found: {filepath}')
-
-        html = self.file_util.read_file(filepath)
-        soup = self.processor.make_soup(html)
-        details = self.processor.get_item_from(
-            soup, config.HIERARCHIES['offer_details']['version'][0]
-        )  # TODO: [0] is a version, implement
-        if not details:
-            raise ParsingError(f'Could not parse out offer details')
-
-        for name, hierarchy in config.HIERARCHY_DETAILS.items():
-            value = self.processor.get_item_from(details, hierarchy)
-            if hierarchy['transformation']:
-                value = hierarchy['transformation'](value, hierarchy.get('attributes'))
-            offer[name] = value
-        return offer
+        return extract_offer(self.processor, filepath)
+
+    def __parse_offer_files(
+        self, items: list[Detail_Page_Audit_Item]
+    ) -> Iterator[tuple[str, Any]]:
+        """
+        Yields the parse_offer_file outcome of every item, in order.
+        Fans the files out to a process pool when there are enough of them
+        for more than one worker, see config.PARSING. The workers are spawned,
+        not forked, as this process already runs download and pool threads
+        whose locks a fork would copy in whatever state they are.
+        """
+        workers = min(
+            config.PARSING['workers'],
+            len(items) // max(1, config.PARSING['min_items_per_worker']),
+        )
+        if workers <= 1:
+            for item in items:
+                yield parse_offer_file(self.processor, item.filepath, item.status_code)
+            return
+
+        log.info(f'Parsing {len(items)} offers in {workers} processes')
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_set_worker_processor,
+            initargs=(self.processor,),
+        ) as executor:
+            yield from executor.map(
+                _parse_offer_file_in_worker,
+                [x.filepath for x in items],
+                [x.status_code for x in items],
+                chunksize=config.PARSING['chunksize'],
+            )
 
     def __insert_parsed_offer_to_db(
         self, detail_page_audit_items: list[Detail_Page_Audit_Item]
     ) -> None:
         fails = []
         for item in detail_page_audit_items:
-            if not db.upsert_offer(
-                id4=item.url_id, entity=self.listing_for, data=item.extracted_offer_data
-            ):
+            item.extracted_offer_data['url_id'] = item.url_id
+            item.extracted_offer_data['entity'] = self.listing_for
+            item.extracted_offer_data['last_seen_at'] = self.run_time
+        with db.transaction():
+            # validators of the stored offers only, committed with them
+            failed = db.bulk_upsert_offers(
+                [x.extracted_offer_data for x in detail_page_audit_items]
+            )
+            self.extractor.save_validators(
+                [x for x in detail_page_audit_items if x.url_id not in failed]
+            )
+        batch = db.Write_Batch()
+        for item in detail_page_audit_items:
+            if item.url_id in failed:
+                log.debug(f'FAILED {item.url_id}, {failed[item.url_id]}')
                 item.error_step = 'Parse'
                 item.error_message = (
                     'Failed while inserting'
@@ -378,10 +703,8 @@ class Scraper_Service:
                     else item.error_message
                 )
                 fails.append(item.url_id)
-            db.execute_no_return(
-                queries.Audit_Logs.update_parsed,
-                (item.parsed_at, item.error_step, item.error_message, item.id),
-            )
+            batch.add(*self.__get_audit_log_update(item, step='Parse'))
+        batch.flush()
         log.info(f'Parsed {len(detail_page_audit_items) - len(fails)} offers')
         if fails:
             log.warning(f'Failed {len(fails)}: {str(fails)[1:-1]}')
@@ -413,7 +736,6 @@ class Scraper_Service:
                     address_data.get('coordinates_lat_lon', ''),
                 ),
             )
-            sleep(0.25)
 
     def __get_number_of_past_failed_tasks(
         self, detail_page_audit_items: list[Detail_Page_Audit_Item]
@@ -421,34 +743,20 @@ class Scraper_Service:
         """
         If the scraper run is a full run, then check if the number of
         tasks (detail page audit items) is higher than the count of
-        links extracted from the listing pages.
+        links from the listing pages selected for a refresh.
 
-        Returns the difference between audit log rows to be visited - extracted links
+        Returns the difference between audit log rows to be visited - links to refresh
         """
-        if self.extractor.detail_urls:
-            return len(detail_page_audit_items) - len(self.extractor.detail_urls)
+        if self.urls_to_refresh:
+            return len(detail_page_audit_items) - len(self.urls_to_refresh)
         return 0
 
-    def __does_offer_html_exist(self, offer: Detail_Page_Audit_Item | str) -> bool:
-        """
-        Check if the offer HTML file exists.
-        """
-        if isinstance(offer, Detail_Page_Audit_Item):
-            filepath = offer.filepath
-        elif isinstance(offer, str):
-            filepath = offer
-        else:
-            raise ValueError(
-                f'Expected Detail_Page_Audit_Item or str, got {type(offer)}'
-            )
-        return self.file_util.does_file_exist(filepath)
-
     @staticmethod
     def __is_offer_active(item: Detail_Page_Audit_Item) -> bool:
         """
         Check if the offer is expired based on the response status code and error message.
         """
-        if item.response and item.response.status_code in range(400, 500):
+        if item.status_code and item.status_code in range(400, 500):
             return False
         if item.error_message == 'EXPIRED':
             return False
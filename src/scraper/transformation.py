@@ -131,3 +131,17 @@ def extract_features(data: list[dict[str, Any]],
         item.get('label', 'default_label'): item['values']
         for item in data
     }
+
+
+def to_json_string(value: Any) -> str:
+    """
+    Returns the Python repr of a value with double quotes, as stored in the *_json columns.
+    """
+    return str(value).replace("'", '"')
+
+
+def join_values(item: dict[str, Any]) -> str|None:
+    """
+    Returns the dictionary values joined with commas, None when empty.
+    """
+    return ','.join([str(x) for x in item.values()]) or None
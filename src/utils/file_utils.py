@@ -1,4 +1,6 @@
+import os
 from pathlib import Path
+from typing import Iterable
 
 import config
 from src.utils.log_util import get_logger
@@ -68,6 +70,29 @@ class File_Util:
         self.write_file(content=page, file=Path(filename))
         return filename
 
+    def write_detail_chunks(self, url: str, chunks: Iterable[bytes]) -> str:
+        """
+        Streams chunks of a detail page to its file as they arrive.
+        The file is written under a temporary name and renamed when complete,
+        so a broken download never leaves a truncated html behind.
+
+        Returns a filepath to the file that was written
+        """
+        id4 = self.get_id4(url)
+        self.__create_id4_folder_if_not_exists(id4)
+        filename = self.get_detail_filename(url)
+        partial = filename + '.part'
+        log.debug(f'{filename}')
+        try:
+            with open(partial, mode='wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(partial, filename)
+        except Exception:
+            Path(partial).unlink(missing_ok=True)
+            raise
+        return filename
+
     def write_file(self, content: str, file: Path) -> None:
         log.debug(f'{file}')
         with file.open(mode='tw', encoding='utf-8') as f:
@@ -1,5 +1,9 @@
+from time import monotonic
+from urllib.parse import urlsplit
+
 import requests
 from config import GCP_API_KEY
+from src.utils.http_util import Rate_Limiter
 
 
 class Reverse_Geocoding:
@@ -7,6 +11,7 @@ class Reverse_Geocoding:
     LOCATION_TYPE = 'ROOFTOP'
     BASE_URL = 'https://maps.googleapis.com/maps/api/geocode/json'
     GCP_API_KEY = GCP_API_KEY
+    RATE_LIMITER = Rate_Limiter()
 
     key_mapping = {
         'route': 'street',
@@ -41,13 +46,17 @@ class Reverse_Geocoding:
             api_key=cls.GCP_API_KEY
         )
 
-    @staticmethod
-    def __send_request(url: str) -> requests.Response:
+    @classmethod
+    def __send_request(cls, url: str) -> requests.Response:
         headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json',
         }
+        host = urlsplit(url).hostname
+        cls.RATE_LIMITER.acquire(host)
+        started_at = monotonic()
         response = requests.get(url, headers=headers)
+        cls.RATE_LIMITER.feedback(host, response.status_code, monotonic() - started_at)
         if response.status_code == 200:
             return response.json()
         else:
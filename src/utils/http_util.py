@@ -1,3 +1,14 @@
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime as dt, timezone
+from email.utils import parsedate_to_datetime
+from hashlib import sha256
+from random import uniform
+from time import monotonic, sleep
+from typing import Any, Callable, Iterator
+from urllib.parse import urlsplit
+
 import requests
 
 import config
@@ -8,27 +19,351 @@ log = get_logger(__name__, 30, True, True)
 log.setLevel(config.LOGGING['levels']['console'])
 
 
+@dataclass
+class _Bucket:
+    rate: float
+    tokens: float
+    updated_at: float = field(default_factory=monotonic)
+    latency: float|None = None
+    baseline_latency: float|None = None
+    decreased_at: float = 0.0
+
+
+class Rate_Limiter:
+    """
+    Token bucket per host with an adaptive refill rate.
+
+    The rate of a host grows step by step while its responses are fast
+    and is cut by decrease_factor on 429/5xx responses or when the latency
+    rises above latency_factor times the baseline latency of the host.
+    The baseline follows the best latency seen and drifts slowly upwards,
+    latencies below latency_floor are never treated as slow.
+    All hosts together are additionally capped at global_rate requests
+    per second.
+
+    Thread-safe, acquire blocks the calling thread until a token is free.
+    """
+    LATENCY_SMOOTHING = 0.3
+    BASELINE_DRIFT = 0.01
+
+    def __init__(
+            self,
+            initial_rate: float = config.RATE_LIMIT['initial_rate'],
+            min_rate: float = config.RATE_LIMIT['min_rate'],
+            max_rate: float = config.RATE_LIMIT['max_rate'],
+            burst: float = config.RATE_LIMIT['burst'],
+            increase_step: float = config.RATE_LIMIT['increase_step'],
+            decrease_factor: float = config.RATE_LIMIT['decrease_factor'],
+            latency_factor: float = config.RATE_LIMIT['latency_factor'],
+            latency_floor: float = config.RATE_LIMIT['latency_floor'],
+            global_rate: float = config.DOWNLOAD['requests_per_second']
+        ):
+        if not 0 < min_rate <= initial_rate <= max_rate:
+            raise ValueError(
+                f'Expected 0 < min_rate <= initial_rate <= max_rate, got {min_rate}, {initial_rate}, {max_rate}'
+            )
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f'decrease_factor must be between 0 and 1, got {decrease_factor}')
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self.latency_floor = latency_floor
+        self.__global = _Bucket(rate=global_rate, tokens=burst)
+        self.__buckets: dict[str, _Bucket] = {}
+        self.__lock = threading.Lock()
+
+    def acquire(self, host: str) -> float:
+        """
+        Blocks until a request to host may be sent.
+
+        Returns the number of seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self.__lock:
+                bucket = self.__get_bucket(host)
+                now = monotonic()
+                self.__refill(bucket, now)
+                self.__refill(self.__global, now)
+                if bucket.tokens >= 1 and self.__global.tokens >= 1:
+                    bucket.tokens -= 1
+                    self.__global.tokens -= 1
+                    return waited
+                wait = max(
+                    (1 - bucket.tokens) / bucket.rate,
+                    (1 - self.__global.tokens) / self.__global.rate
+                )
+            sleep(wait)
+            waited += wait
+
+    def feedback(self, host: str, status_code: int|None, latency: float) -> None:
+        """
+        Adjusts the rate of host based on the outcome of a request.
+        status_code is None when the request failed without a response.
+        """
+        with self.__lock:
+            bucket = self.__get_bucket(host)
+            if bucket.latency is None:
+                bucket.latency = latency
+            else:
+                bucket.latency += self.LATENCY_SMOOTHING * (latency - bucket.latency)
+            if bucket.baseline_latency is None or bucket.latency < bucket.baseline_latency:
+                bucket.baseline_latency = bucket.latency
+            else:
+                bucket.baseline_latency += self.BASELINE_DRIFT * (bucket.latency - bucket.baseline_latency)
+
+            throttled = status_code is None or status_code == 429 or status_code >= 500
+            slow = bucket.latency > max(bucket.baseline_latency, self.latency_floor) * self.latency_factor
+            if throttled or slow:
+                self.__decrease(host, bucket, 'throttled' if throttled else 'slow')
+            else:
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase_step / bucket.rate)
+
+    def get_rate(self, host: str) -> float:
+        with self.__lock:
+            return self.__get_bucket(host).rate
+
+    def __decrease(self, host: str, bucket: _Bucket, reason: str) -> None:
+        """
+        Cuts the rate at most once per refill interval,
+        so a burst of failures does not collapse it to min_rate at once.
+        """
+        now = monotonic()
+        if now - bucket.decreased_at < 1 / bucket.rate:
+            return
+        bucket.rate = max(self.min_rate, bucket.rate * self.decrease_factor)
+        bucket.tokens = min(bucket.tokens, 0)
+        bucket.decreased_at = now
+        log.debug(f'{host} {reason}, rate down to {bucket.rate:.2f}/s')
+
+    def __get_bucket(self, host: str) -> _Bucket:
+        if host not in self.__buckets:
+            self.__buckets[host] = _Bucket(rate=self.initial_rate, tokens=self.burst)
+        return self.__buckets[host]
+
+    def __refill(self, bucket: _Bucket, now: float) -> None:
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * bucket.rate)
+        bucket.updated_at = now
+
+
+@dataclass
+class Retry_Policy:
+    """
+    Decides whether a request is retried and how long to wait before.
+
+    The delay is a full-jitter exponential backoff, unless the response
+    carries a Retry-After header, which is honoured up to retry_after_max.
+    """
+    max_attempts: int = config.RETRY['max_attempts']
+    backoff_base: float = config.RETRY['backoff_base']
+    backoff_max: float = config.RETRY['backoff_max']
+    retry_after_max: float = config.RETRY['retry_after_max']
+    statuses: tuple[int, ...] = tuple(config.RETRY['statuses'])
+
+    def should_retry(self, attempt: int, status_code: int|None) -> bool:
+        """
+        status_code is None when the request failed without a response.
+        """
+        if attempt >= self.max_attempts:
+            return False
+        return status_code is None or status_code in self.statuses
+
+    def get_delay(self, attempt: int, response: requests.Response|None = None) -> float:
+        """
+        Returns the number of seconds to wait before the next attempt.
+        attempt is the number of the attempt that just failed, starting at 1.
+        """
+        retry_after = self.__parse_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.retry_after_max)
+        return uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def __parse_retry_after(response: requests.Response|None) -> float|None:
+        """
+        Retry-After is either a number of seconds or a HTTP date.
+        """
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        if value.strip().isdigit():
+            return float(value)
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            log.debug(f'Invalid Retry-After header: {value}')
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - dt.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class _Circuit:
+    failures: int = 0
+    opened_until: float|None = None
+    probing: bool = False
+    probe_started_at: float = 0.0
+
+
+class Circuit_Breaker:
+    """
+    Pauses requests to a host after failure_threshold consecutive failures.
+
+    While the circuit of a host is open, wait blocks until the cooldown
+    passes. Then a single probe request is let through: its success closes
+    the circuit, its failure opens it for another cooldown. A probe which
+    ends without either has to be released, one which is not released
+    within a cooldown is taken over by the next waiting request.
+
+    Thread-safe.
+    """
+    def __init__(
+            self,
+            failure_threshold: int = config.CIRCUIT_BREAKER['failure_threshold'],
+            cooldown: float = config.CIRCUIT_BREAKER['cooldown']
+        ):
+        if failure_threshold < 1:
+            raise ValueError(f'failure_threshold must be at least 1, got {failure_threshold}')
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.__circuits: dict[str, _Circuit] = {}
+        self.__condition = threading.Condition()
+
+    def wait(self, host: str) -> bool:
+        """
+        Blocks until a request to host may be sent.
+
+        Returns True when the request is the probe of a half-open circuit.
+        """
+        with self.__condition:
+            while True:
+                circuit = self.__get_circuit(host)
+                if circuit.opened_until is None:
+                    return False
+                now = monotonic()
+                remaining = circuit.opened_until - now
+                if remaining > 0:
+                    self.__condition.wait(remaining)
+                elif not circuit.probing:
+                    circuit.probing = True
+                    circuit.probe_started_at = now
+                    log.info(f'{host} circuit half-open, probing')
+                    return True
+                elif now - circuit.probe_started_at >= self.cooldown:
+                    circuit.probe_started_at = now
+                    log.warning(f'{host} probe not finished after {self.cooldown}s, probing again')
+                    return True
+                else:
+                    self.__condition.wait(circuit.probe_started_at + self.cooldown - now)
+
+    def release(self, host: str) -> None:
+        """
+        Ends a probe which was neither a success nor a failure of the host,
+        e.g. an invalid URL, so the next request can probe.
+        """
+        with self.__condition:
+            circuit = self.__get_circuit(host)
+            if circuit.probing:
+                circuit.probing = False
+                self.__condition.notify_all()
+
+    def record_success(self, host: str) -> None:
+        with self.__condition:
+            circuit = self.__get_circuit(host)
+            if circuit.opened_until is not None:
+                log.info(f'{host} circuit closed')
+            circuit.failures = 0
+            circuit.opened_until = None
+            circuit.probing = False
+            self.__condition.notify_all()
+
+    def record_failure(self, host: str) -> None:
+        with self.__condition:
+            circuit = self.__get_circuit(host)
+            circuit.failures += 1
+            if circuit.probing or circuit.failures >= self.failure_threshold:
+                circuit.opened_until = monotonic() + self.cooldown
+                circuit.probing = False
+                log.warning(f'{host} circuit open for {self.cooldown}s after {circuit.failures} failures')
+            self.__condition.notify_all()
+
+    def is_open(self, host: str) -> bool:
+        with self.__condition:
+            return self.__get_circuit(host).opened_until is not None
+
+    def __get_circuit(self, host: str) -> _Circuit:
+        if host not in self.__circuits:
+            self.__circuits[host] = _Circuit()
+        return self.__circuits[host]
+
+
+@dataclass
+class Page_Download:
+    """
+    Outcome of HTTP_Util.download_page, the body itself lives on disk.
+    A download which failed after all retries has no status_code and its error set.
+    """
+    status_code: int|None
+    headers: dict[str, str]
+    filepath: str|None = None
+    not_modified: bool = False
+    validators: dict[str, str|None]|None = None
+    error: str|None = None
+
+
 class HTTP_Util:
     HEADERS = config.HEADERS
     IMG_HEADERS = config.IMG_HEADERS
+    # Retried, they may also break off a body midway
+    TRANSIENT_ERRORS = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        requests.exceptions.ContentDecodingError,
+    )
 
 
-    def __init__(self, session: requests.Session = requests.Session()):
+    def __init__(
+            self,
+            session: requests.Session = requests.Session(),
+            rate_limiter: Rate_Limiter = Rate_Limiter(),
+            retry_policy: Retry_Policy = Retry_Policy(),
+            circuit_breaker: Circuit_Breaker = Circuit_Breaker(),
+            timeout: float = config.DOWNLOAD['timeout'],
+            chunk_size: int = config.DOWNLOAD['chunk_size']
+        ):
         self.session = session
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.timeout = timeout
+        self.chunk_size = chunk_size
 
     def fetch_page(self, url: str, headers: dict|None=None) -> requests.Response:
         """
         Sends a HTTP request to a url with predefined headers.
+        Waits for the circuit breaker and the rate limiter of the url's host
+        first. Connection errors, 429 and 5xx responses are retried
+        according to the retry policy.
 
         Returns a requests.Response object
         """
         h = headers if headers else self.HEADERS
         log.debug(f'{url}')
-        response = self.session.get(url, headers=h)
+        response = self.__send_with_retries(url, h)
         code = response.status_code
         try:
             response.raise_for_status()
-            if code in range(300, 400):
+            if code == 304:
+                log.debug(f'{code} NOT MODIFIED')
+            elif code in range(300, 400):
                 log.warning(f'{code} {response.text}')
                 # TODO: handle redirects
             else:
@@ -38,11 +373,171 @@ class HTTP_Util:
             if code in range(400, 500):
                 log.debug(f'\033[91m{code} EXPIRED\033[0m')
                 log.debug(f'RESPONSE: {response.text}')
-            elif code > 500:
+            elif code in range(500, 600):
                 log.error(f'\033[91m{code} SERVER_FAULT\033[0m')
-                # TODO retry-after?
         return response
 
+    def download_page(
+            self,
+            url: str,
+            write: Callable[[Iterator[bytes]], str],
+            validators: dict[str, str|None]|None = None
+        ) -> Page_Download:
+        """
+        Streams the body of url to write chunk by chunk, so the page
+        is never held in memory. write consumes the chunks and returns
+        the path of the written file. The body is read within the retries,
+        a body broken off midway is retried like a failed request.
+
+        With the validators stored for the url the request is conditional
+        and the page is reported as not_modified on a 304, which has no body,
+        or when the hash of the body equals the stored one.
+        The validators of a 200 response are returned.
+
+        A download failing after all retries is returned with its error,
+        so a single url does not abort a whole batch.
+        """
+        headers = self.__get_conditional_headers(validators) if validators else self.HEADERS
+        log.debug(f'{url}')
+
+        def read(response: requests.Response) -> Page_Download:
+            download = Page_Download(
+                status_code=response.status_code,
+                headers=dict(response.headers)
+            )
+            if response.status_code == 304:
+                download.not_modified = True
+                return download
+            body_hash = sha256()
+            download.filepath = write(self.__iter_chunks(response, body_hash))
+            if download.status_code == 200:
+                download.validators = {
+                    'etag': download.headers.get('ETag'),
+                    'last_modified': download.headers.get('Last-Modified'),
+                    'body_hash': body_hash.hexdigest()
+                }
+                download.not_modified = (
+                    bool(validators) and download.validators['body_hash'] == validators.get('body_hash')
+                )
+            return download
+
+        try:
+            download = self.__send_with_retries(url, headers, stream=True, read=read)
+        except requests.exceptions.RequestException as ex:
+            log.error(f'{url} download failed: {type(ex).__name__} {ex}')
+            return Page_Download(status_code=None, headers={}, error=f'{type(ex).__name__}: {ex}')
+        self.__log_status(download.status_code)
+        return download
+
+    def probe_page(self, url: str) -> int|None:
+        """
+        Checks whether a page still exists without downloading its body.
+        Sends a HEAD request and, when the server does not allow HEAD,
+        a GET that is closed right after the status line and headers are read.
+
+        Returns the status code, None when the probe fails after all retries,
+        so a single url does not abort a whole batch.
+        """
+        try:
+            response = self.__send_with_retries(url, self.HEADERS, method='HEAD')
+            response.close()
+            if response.status_code in (405, 501):
+                response = self.__send_with_retries(url, self.HEADERS, stream=True)
+                response.close()
+        except requests.exceptions.RequestException as ex:
+            log.error(f'{url} probe failed: {type(ex).__name__} {ex}')
+            return None
+        self.__log_status(response.status_code)
+        return response.status_code
+
+    def __get_conditional_headers(self, stored: dict[str, str|None]) -> dict[str, str]:
+        headers = dict(self.HEADERS)
+        if stored.get('etag'):
+            headers['If-None-Match'] = stored['etag']
+        if stored.get('last_modified'):
+            headers['If-Modified-Since'] = stored['last_modified']
+        return headers
+
+    def __iter_chunks(self, response: requests.Response, body_hash: Any) -> Iterator[bytes]:
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            body_hash.update(chunk)
+            yield chunk
+
+    @staticmethod
+    def __log_status(code: int) -> None:
+        """
+        Logs the status of a streamed response without touching its body.
+        """
+        if code in range(200, 300):
+            log.debug(f'\033[92m{code} OK\033[0m')
+        elif code == 304:
+            log.debug(f'{code} NOT MODIFIED')
+        elif code in range(300, 400):
+            log.warning(f'{code} REDIRECT')
+        elif code in range(400, 500):
+            log.debug(f'\033[91m{code} EXPIRED\033[0m')
+        elif code in range(500, 600):
+            log.error(f'\033[91m{code} SERVER_FAULT\033[0m')
+
+    def __send_with_retries(
+            self,
+            url: str,
+            headers: dict,
+            stream: bool = False,
+            method: str = 'GET',
+            read: Callable[[requests.Response], Any]|None = None
+        ) -> requests.Response|Any:
+        """
+        Returns the first response that is not retried.
+        With read, the response is passed to it and closed, and its result
+        is returned instead. Errors while reading are retried too.
+        Raises the last transient error when all attempts failed,
+        other exceptions are raised at once.
+        """
+        host = urlsplit(url).hostname
+        attempt = 0
+        while True:
+            attempt += 1
+            is_probe = self.circuit_breaker.wait(host)
+            started_at = monotonic()
+            try:
+                self.rate_limiter.acquire(host)
+                started_at = monotonic()
+                response = self.session.request(
+                    method, url, headers=headers, timeout=self.timeout, stream=stream
+                )
+                code = response.status_code
+                if read and not self.retry_policy.should_retry(attempt, code):
+                    with response:
+                        result = read(response)
+                else:
+                    result = response
+            except self.TRANSIENT_ERRORS as ex:
+                self.rate_limiter.feedback(host, None, monotonic() - started_at)
+                self.circuit_breaker.record_failure(host)
+                if not self.retry_policy.should_retry(attempt, None):
+                    raise
+                delay = self.retry_policy.get_delay(attempt)
+                log.warning(f'{url} {type(ex).__name__}, retry {attempt} in {delay:.1f}s')
+                sleep(delay)
+                continue
+            except BaseException:
+                if is_probe:
+                    self.circuit_breaker.release(host)
+                raise
+
+            self.rate_limiter.feedback(host, code, monotonic() - started_at)
+            if code == 429 or code in range(500, 600):
+                self.circuit_breaker.record_failure(host)
+            else:
+                self.circuit_breaker.record_success(host)
+            if not self.retry_policy.should_retry(attempt, code):
+                return result
+            delay = self.retry_policy.get_delay(attempt, response)
+            log.warning(f'{url} {code}, retry {attempt} in {delay:.1f}s')
+            response.close()
+            sleep(delay)
+
     def fetch_image(self, url: str) -> requests.Response:
         return self.fetch_page(url, self.IMG_HEADERS)
 
@@ -60,3 +555,70 @@ class HTTP_Util:
 
     def get_image_type_from_accept_header(self, response: requests.Response) -> str:
         return response.headers.get('Content-Type', '/').split('/')[-1]
+
+
+class Async_Downloader:
+    """
+    Fetches many URLs concurrently on top of a HTTP_Util.
+
+    The blocking requests calls are sent from worker threads, so the
+    session, headers and logging of the HTTP_Util are reused as they are.
+    Concurrency is limited per host, the request rate is left to
+    the Rate_Limiter of the HTTP_Util.
+    """
+    def __init__(
+            self,
+            http_util: HTTP_Util,
+            max_concurrency_per_host: int = config.DOWNLOAD['max_concurrency_per_host']
+        ):
+        if max_concurrency_per_host < 1:
+            raise ValueError(f'max_concurrency_per_host must be at least 1, got {max_concurrency_per_host}')
+        self.http_util = http_util
+        self.max_concurrency_per_host = max_concurrency_per_host
+
+    def fetch_pages(
+            self,
+            urls: list[str],
+            on_done: Callable[[int, Any], None]|None = None,
+            fetch: Callable[[str], Any]|None = None
+        ) -> list[Any]:
+        """
+        Fetches all urls and returns the results in the order of urls.
+
+        fetch is the function called for every url,
+        defaults to HTTP_Util.fetch_page.
+        on_done is called with the index of the url and its result
+        as soon as a single download finishes.
+        """
+        if not urls:
+            return []
+        return asyncio.run(self.__fetch_all(urls, on_done, fetch or self.http_util.fetch_page))
+
+    async def __fetch_all(
+            self,
+            urls: list[str],
+            on_done: Callable[[int, Any], None]|None,
+            fetch: Callable[[str], Any]
+        ) -> list[Any]:
+        host_semaphores: dict[str, asyncio.Semaphore] = {}
+        tasks = []
+        for i, url in enumerate(urls):
+            host = urlsplit(url).hostname
+            if host not in host_semaphores:
+                host_semaphores[host] = asyncio.Semaphore(self.max_concurrency_per_host)
+            tasks.append(self.__fetch(i, url, host_semaphores[host], on_done, fetch))
+        return await asyncio.gather(*tasks)
+
+    async def __fetch(
+            self,
+            i: int,
+            url: str,
+            semaphore: asyncio.Semaphore,
+            on_done: Callable[[int, Any], None]|None,
+            fetch: Callable[[str], Any]
+        ) -> Any:
+        async with semaphore:
+            result = await asyncio.to_thread(fetch, url)
+        if on_done:
+            on_done(i, result)
+        return result
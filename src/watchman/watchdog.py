@@ -121,7 +121,6 @@ class Watchdog:
                 (url_id, image_id, http_status_code, str(image_path), img_type)
             )
             added += 1
-            sleep(0.04)
         return added
 
     def _fetch_image(self, url: str) -> bytes:
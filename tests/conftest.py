@@ -0,0 +1,22 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+import config
+from src.database import db
+
+
+@pytest.fixture
+def database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    """
+    A new SQLite database with the latest schema.
+    """
+    if config.OTODOM_DATABASE_TYPE.lower() != 'sqlite':
+        pytest.skip('runs on a temporary SQLite database')
+    db.close_pool()
+    monkeypatch.setattr(config, 'OTODOM_DATABASE_NAME', str(tmp_path / 'otodom_links.sqlite3'))
+    monkeypatch.setattr(db, '_schema_checked', False)
+    db.create_tables()
+    yield
+    db.close_pool()
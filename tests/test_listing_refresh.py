@@ -0,0 +1,41 @@
+"""
+Listing summaries compared with the latest stored offer versions,
+which decides whether a detail page is downloaded in listing-only mode.
+"""
+import pytest
+
+from src.scraper import parser
+from src.scraper.spider import Scraper_Service
+
+
+has_summary_changed = Scraper_Service._Scraper_Service__has_summary_changed
+STORED = {'price': 1150000, 'area': 164.0, 'rooms': 7}
+
+
+@pytest.mark.parametrize('rooms_number, rooms', [('THREE', 3), ('TEN', 10), ('MORE', 99), ('SIX_OR_MORE', None), ('UNKNOWN', None), (None, None)])
+def test_parse_rooms_number(rooms_number: str|None, rooms: int|None):
+    assert parser.parse_rooms_number(rooms_number) == rooms
+
+
+def test_unchanged():
+    assert not has_summary_changed(STORED, {'price': 1150000, 'area': 164, 'rooms': 7})
+
+
+def test_open_ended_rooms_is_not_a_change():
+    summary = {'price': 1150000, 'area': 164, 'rooms': parser.parse_rooms_number('SIX_OR_MORE')}
+    assert not has_summary_changed(STORED, summary)
+
+
+@pytest.mark.parametrize('summary', [
+    {'price': 1099000, 'area': 164, 'rooms': None},
+    {'price': 1150000, 'area': 160, 'rooms': 7},
+    {'price': 1150000, 'area': 164, 'rooms': 6},
+])
+def test_changed(summary: dict):
+    assert has_summary_changed(STORED, summary)
+
+
+def test_missing_side_is_a_change():
+    assert has_summary_changed(None, {'price': 1150000, 'area': 164, 'rooms': 7})
+    assert has_summary_changed(STORED, None)
+    assert has_summary_changed({**STORED, 'rooms': None}, {'price': 1150000, 'area': 164, 'rooms': 7})
@@ -0,0 +1,49 @@
+"""
+config.OFFER_FIELDS on trimmed __NEXT_DATA__ of saved detail pages,
+against the columns expected for each of them.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+import config
+from src.scraper import hierarchies, mapping
+from src.scraper.extraction import Page_Processor
+from src.scraper.spider import extract_offer
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+CASES = sorted([x.name.removesuffix('.json') for x in (FIXTURES / 'next_data').glob('*.json') if not x.name.endswith('.columns.json')])
+
+
+def read_json(path: Path) -> dict:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def get_offer(next_data: dict) -> dict:
+    """
+    The fields of the offer as extract_offer gets them from a detail page.
+    """
+    details = hierarchies.OFFER_DETAILS[0].run_from(next_data, 1)
+    return {name: accessor(details) for name, accessor in hierarchies.DETAILS.items()}
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_offer_columns(case: str):
+    offer = get_offer(read_json(FIXTURES / 'next_data' / f'{case}.json'))
+    assert mapping.OFFER.extract(offer) == read_json(FIXTURES / 'next_data' / f'{case}.columns.json')
+
+
+def test_offer_columns_from_detail_page():
+    offer = extract_offer(Page_Processor(), str(FIXTURES / 'pages' / 'detail.html'))
+    assert mapping.OFFER.extract(offer) == read_json(FIXTURES / 'next_data' / 'flat_agency.columns.json')
+
+
+def test_missing_fields():
+    columns = mapping.OFFER.extract({})
+    assert list(columns) == list(config.OFFER_FIELDS)
+    assert columns['postal_code'] is None
+    assert columns['coordinates_lat_lon'] is None
+    assert columns['media_json'] == '[]'
@@ -0,0 +1,26 @@
+"""
+The migrations applied to a new SQLite database, and the query plans
+of the hot queries on it.
+"""
+import pytest
+
+from src.database import db, migrations
+
+
+def test_schema_is_latest(database: None):
+    with db.transaction() as cursor:
+        assert migrations.get_version(cursor) == migrations.LATEST_VERSION
+
+
+def test_migrations_can_run_again(database: None):
+    with db.transaction() as cursor:
+        for _, _, steps in migrations.MIGRATIONS:
+            for step in steps:
+                step(cursor)
+        assert migrations.migrate(cursor) == migrations.LATEST_VERSION
+
+
+@pytest.mark.parametrize('name', [x[0] for x in migrations.HOT_QUERIES])
+def test_hot_query_uses_index(database: None, name: str):
+    with db.transaction() as cursor:
+        assert migrations.check_indexes(cursor)[name]
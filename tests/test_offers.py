@@ -0,0 +1,70 @@
+"""
+Versioning of the offers by bulk_upsert_offers on a new SQLite database.
+"""
+import json
+from pathlib import Path
+
+from src.database import db, queries
+
+
+COLUMNS = Path(__file__).parent / 'fixtures' / 'next_data' / 'flat_agency.columns.json'
+
+
+def get_offer(url_id: str, **fields) -> dict:
+    with open(COLUMNS, encoding='utf-8') as file:
+        return {'status': 1, **json.load(file), 'url_id': url_id, 'entity': 'flats', **fields}
+
+
+def get_versions(url_id: str) -> list[dict]:
+    return db.execute_with_return(
+        f'SELECT id, status, price, last_seen_at FROM {queries.Offers.TABLE_NAME} WHERE url_id = {db.PS} ORDER BY id',
+        (url_id,),
+    )
+
+
+def get_latest(url_id: str) -> dict:
+    return db.execute_with_return(
+        f'SELECT offer_id, price, price_previous, price_diff FROM {queries.Offers_Latest.TABLE_NAME} WHERE url_id = {db.PS}',
+        (url_id,),
+    )[0]
+
+
+def test_failing_offer_keeps_active_version(database: None):
+    assert db.bulk_upsert_offers([get_offer('ID1'), get_offer('ID2')]) == {}
+
+    failed = db.bulk_upsert_offers([get_offer('ID1', price=1), get_offer('ID2', price=2, city=None)])
+
+    assert list(failed) == ['ID2']
+    assert [(x['status'], x['price']) for x in get_versions('ID1')][-1] == (1, 1)
+    versions = get_versions('ID2')
+    assert len(versions) == 1
+    assert versions[0]['status'] == 1
+    assert get_latest('ID2')['offer_id'] == versions[0]['id']
+
+
+def test_unchanged_offer_is_only_seen_again(database: None):
+    assert db.bulk_upsert_offers([get_offer('ID1', last_seen_at='2025-05-01T10:00:00')]) == {}
+    latest = get_latest('ID1')
+
+    assert db.bulk_upsert_offers([get_offer('ID1', last_seen_at='2025-05-02T10:00:00')]) == {}
+
+    versions = get_versions('ID1')
+    assert len(versions) == 1
+    assert versions[0]['status'] == 1
+    assert versions[0]['last_seen_at'] == '2025-05-02T10:00:00'
+    assert get_latest('ID1') == latest
+
+
+def test_price_change_in_latest(database: None):
+    assert db.bulk_upsert_offers([get_offer('ID1', price=500000)]) == {}
+    assert get_latest('ID1')['price_previous'] is None
+
+    assert db.bulk_upsert_offers([get_offer('ID1', price=480000)]) == {}
+
+    versions = get_versions('ID1')
+    assert [(x['status'], x['price']) for x in versions] == [(2, 500000), (1, 480000)]
+    latest = get_latest('ID1')
+    assert latest['offer_id'] == versions[-1]['id']
+    assert latest['price'] == 480000
+    assert latest['price_previous'] == 500000
+    assert latest['price_diff'] == 20000
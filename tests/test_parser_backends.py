@@ -0,0 +1,74 @@
+"""
+Every parser backend has to give the results html.parser gives
+on the saved listing and detail pages.
+"""
+from pathlib import Path
+
+import pytest
+
+from src.scraper import hierarchies
+from src.scraper.extraction import Page_Processor
+from src.utils.file_utils import File_Util
+
+
+PAGES = Path(__file__).parent / 'fixtures' / 'pages'
+LISTING = File_Util.read_file(str(PAGES / 'listing.html'))
+DETAIL = File_Util.read_file(str(PAGES / 'detail.html'))
+BACKENDS = {'lxml': 'lxml', 'selectolax': 'selectolax.lexbor'}
+
+
+@pytest.fixture(scope='module')
+def reference() -> Page_Processor:
+    return Page_Processor(parser_backend='html.parser')
+
+
+@pytest.fixture(scope='module', params=list(BACKENDS))
+def processor(request: pytest.FixtureRequest) -> Page_Processor:
+    pytest.importorskip(BACKENDS[request.param])
+    return Page_Processor(parser_backend=request.param)
+
+
+def get_details(processor: Page_Processor, raw_html: str) -> dict:
+    return processor.get_item_from(processor.make_soup(raw_html), hierarchies.OFFER_DETAILS[0])
+
+
+def test_reference_results(reference: Page_Processor):
+    assert reference.get_links(LISTING) == [
+        '/pl/oferta/mieszkanie-3-pokoje-z-balkonem-ul-slowianska-ID4sXyZ',
+        '/pl/oferta/dom-wolnostojacy-z-ogrodem-radwanice-ID4sWq2',
+        '/pl/oferta/mieszkanie-2-pokojowe-ID4sZa1',
+    ]
+    pagination = reference.get_pagination(LISTING)
+    assert (pagination['totalPages'], pagination['itemsPerPage'], pagination['currentPage']) == (4, 36, 1)
+    assert get_details(reference, DETAIL)['id'] == 66512430
+
+
+def test_get_links(reference: Page_Processor, processor: Page_Processor):
+    assert processor.get_links(LISTING) == reference.get_links(LISTING)
+
+
+def test_get_pagination(reference: Page_Processor, processor: Page_Processor):
+    assert processor.get_pagination(LISTING) == reference.get_pagination(LISTING)
+
+
+def test_get_listing_summaries(reference: Page_Processor, processor: Page_Processor):
+    assert processor.get_listing_summaries(LISTING) == reference.get_listing_summaries(LISTING)
+
+
+@pytest.mark.parametrize('hierarchy', [hierarchies.PAGINATION, hierarchies.LISTING_ITEMS], ids=['pagination', 'listing_items'])
+def test_get_item_from_listing(reference: Page_Processor, processor: Page_Processor, hierarchy):
+    assert processor.get_item_from(processor.make_soup(LISTING), hierarchy) == \
+        reference.get_item_from(reference.make_soup(LISTING), hierarchy)
+
+
+def test_get_item_from_detail(reference: Page_Processor, processor: Page_Processor):
+    assert get_details(processor, DETAIL) == get_details(reference, DETAIL)
+
+
+@pytest.mark.parametrize('method', ['get_links', 'get_pagination'])
+def test_failures_on_detail_page(reference: Page_Processor, processor: Page_Processor, method: str):
+    with pytest.raises(ValueError) as expected:
+        getattr(reference, method)(DETAIL)
+    with pytest.raises(ValueError) as actual:
+        getattr(processor, method)(DETAIL)
+    assert actual.type is expected.type
@@ -0,0 +1,39 @@
+"""
+The revisit schedule read and written by Revisit_Scheduler.
+"""
+from src.database import db, queries
+from src.scraper.scheduler import Revisit_Scheduler
+
+
+RUN_TIME = '2026-10-18T12:00:00'
+
+
+def add_urls(entity: str, url_ids: list[str]) -> None:
+    run_id = db.execute_with_return(queries.Run_Logs.create_log, (entity, RUN_TIME))[0]['id']
+    db.insert_many(
+        queries.Urls.TABLE_NAME,
+        ['url_id', 'url', 'status', 'created_run_id'],
+        [(x, f'/pl/oferta/{x}', 1, run_id) for x in url_ids],
+    )
+
+
+def get_schedule() -> dict[str, str]:
+    return {
+        row['url_id']: row['next_check_at']
+        for row in db.execute_with_return(f'SELECT url_id, next_check_at FROM {queries.Revisit_Schedule.TABLE_NAME}')
+    }
+
+
+def test_reschedule_and_select_due(database: None):
+    add_urls('flats', ['F1', 'F2', 'F3'])
+    add_urls('houses', ['H1'])
+    Revisit_Scheduler('flats', '2026-10-18T00:00:00', min_hours=6).reschedule({'F1': True, 'F2': False})
+    Revisit_Scheduler('houses', RUN_TIME, min_hours=6).reschedule({'H1': True})
+    assert get_schedule() == {'F1': '2026-10-18T06:00:00', 'F2': '2026-10-18T06:00:00', 'H1': '2026-10-18T18:00:00'}
+
+    scheduler = Revisit_Scheduler('flats', RUN_TIME, budget_per_run=10)
+    assert scheduler.select_due(['F1', 'F2', 'F3']) == ['F3', 'F1', 'F2']
+    assert scheduler.select_due(['F1', 'F2', 'F3'], already_selected=8) == ['F3', 'F1']
+    # H1 is scheduled for houses only, so it is never checked as a flat
+    assert scheduler.select_due(['H1']) == ['H1']
+    assert Revisit_Scheduler('houses', RUN_TIME).select_due(['H1']) == []
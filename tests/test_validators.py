@@ -0,0 +1,41 @@
+"""
+HTTP validators saved with the offers they belong to.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from src.database import db, queries
+from src.database.validators import Validator_Store
+
+
+COLUMNS = Path(__file__).parent / 'fixtures' / 'next_data' / 'flat_agency.columns.json'
+URL = 'https://www.otodom.pl/pl/oferta/mieszkanie-3-pokoje-z-balkonem-ul-slowianska-ID4sXyZ'
+VALIDATORS = {'etag': '"abc"', 'last_modified': None, 'body_hash': '0f' * 32}
+
+
+def get_offer() -> dict:
+    with open(COLUMNS, encoding='utf-8') as file:
+        return {'status': 1, **json.load(file), 'url_id': 'ID4sXyZ', 'entity': 'flats'}
+
+
+def count(table: str) -> int:
+    return db.execute_with_return(f'SELECT COUNT(*) AS n FROM {table}')[0]['n']
+
+
+def test_save_and_load(database: None):
+    Validator_Store().save({URL: VALIDATORS, f'{URL}2': {'etag': None, 'last_modified': 'x', 'body_hash': None}})
+    assert Validator_Store().get(URL) == VALIDATORS
+    assert count(queries.Http_Validators.TABLE_NAME) == 2
+
+
+def test_rolled_back_with_the_offers(database: None):
+    store = Validator_Store()
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            assert db.bulk_upsert_offers([get_offer()]) == {}
+            store.save({URL: VALIDATORS})
+            raise RuntimeError('commit failed')
+    assert count(queries.Offers.TABLE_NAME) == 0
+    assert count(queries.Http_Validators.TABLE_NAME) == 0